@@ -0,0 +1,315 @@
+# ---------------- BACKPLANE DE BROADCAST (PUB/SUB) ---------------- #
+"""
+Este arquivo, backplane.py, implementa a camada de publicação/assinatura
+(pub/sub) usada para entregar eventos em tempo real entre processos.
+
+Os mapas de conexões WebSocket (`chat_ws._connections` e
+`notifications.manager`) existem apenas dentro de cada worker. Para que uma
+mensagem publicada no worker A chegue aos sockets do worker B, todo broadcast
+é publicado no backplane e cada worker, inscrito no tópico, entrega o evento
+às suas conexões locais.
+
+Backends disponíveis (variável BROADCAST_BACKEND):
+- `memory`: entrega direta dentro do próprio processo (padrão, 1 worker).
+- `redis`: protocolo RESP (Redis/compatíveis) via PUBLISH/SUBSCRIBE, sem
+  dependências externas. Para desenvolvimento e testes existe um servidor
+  local compatível (`LocalBroker`):
+
+    python -m backend.app.backplane --port 6379
+"""
+import argparse
+import asyncio
+import json
+import logging
+import sys
+from abc import ABC, abstractmethod
+from typing import Awaitable, Callable
+from urllib.parse import urlparse
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+Handler = Callable[[dict], Awaitable[None]]
+
+
+# --- Interface Base ---
+# Mantém os handlers por tópico e os executa para cada mensagem recebida.
+# Uma falha em um handler é registrada no log sem interromper os demais.
+# Cada backend implementa `publish`.
+class Backplane(ABC):
+    def __init__(self):
+        self._handlers: dict[str, list[Handler]] = {}
+        self.published = 0
+        self.received = 0
+
+    def subscribe(self, topic: str, handler: Handler) -> None:
+        """Registra um handler. Deve ser chamado antes de `start()`."""
+        self._handlers.setdefault(topic, []).append(handler)
+
+    async def start(self) -> None:
+        pass
+
+    async def stop(self) -> None:
+        pass
+
+    @abstractmethod
+    async def publish(self, topic: str, message: dict) -> None:
+        """Publica a mensagem para os handlers do tópico em todos os workers."""
+
+    async def _dispatch(self, topic: str, message: dict) -> None:
+        self.received += 1
+        for handler in self._handlers.get(topic, ()):
+            try:
+                await handler(message)
+            except Exception:
+                logger.exception("Falha ao processar mensagem do tópico %s", topic)
+
+    def stats(self) -> dict:
+        return {
+            "backend": type(self).__name__,
+            "topics": sorted(self._handlers),
+            "published": self.published,
+            "received": self.received,
+        }
+
+
+# --- Backend em Memória ---
+# Entrega a mensagem diretamente aos handlers do próprio processo.
+class InMemoryBackplane(Backplane):
+    async def publish(self, topic: str, message: dict) -> None:
+        self.published += 1
+        await self._dispatch(topic, message)
+
+
+# --- Protocolo RESP ---
+# Codificação de comandos e leitura de respostas do protocolo do Redis.
+def _encode_command(*args: str | bytes) -> bytes:
+    parts = [b"*%d\r\n" % len(args)]
+    for arg in args:
+        data = arg.encode() if isinstance(arg, str) else arg
+        parts.append(b"$%d\r\n%s\r\n" % (len(data), data))
+    return b"".join(parts)
+
+
+async def _read_reply(reader: asyncio.StreamReader):
+    line = await reader.readline()
+    if not line:
+        raise ConnectionError("Conexão com o backplane encerrada")
+    kind, body = line[:1], line[1:-2]
+    if kind == b"+":
+        return body.decode()
+    if kind == b"-":
+        raise ConnectionError(body.decode())
+    if kind == b":":
+        return int(body)
+    if kind == b"$":
+        length = int(body)
+        if length < 0:
+            return None
+        data = await reader.readexactly(length + 2)
+        return data[:-2]
+    if kind == b"*":
+        count = int(body)
+        if count < 0:
+            return None
+        return [await _read_reply(reader) for _ in range(count)]
+    raise ConnectionError(f"Resposta RESP inválida: {line!r}")
+
+
+# --- Backend Redis (RESP) ---
+# Usa duas conexões: uma para PUBLISH (requisição/resposta) e outra dedicada
+# ao SUBSCRIBE, lida por uma task em segundo plano que se reconecta em caso
+# de falha. Os tópicos recebem o prefixo `uconnect:` no servidor.
+class RedisBackplane(Backplane):
+    prefix = "uconnect:"
+
+    def __init__(self, url: str):
+        super().__init__()
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "127.0.0.1"
+        self.port = parsed.port or 6379
+        self.password = parsed.password
+        self._publisher: tuple[asyncio.StreamReader, asyncio.StreamWriter] | None = None
+        self._publish_lock = asyncio.Lock()
+        self._reader_task: asyncio.Task | None = None
+        self._subscribed = asyncio.Event()
+        self.reconnects = 0
+
+    async def _connect(self) -> tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        if self.password:
+            writer.write(_encode_command("AUTH", self.password))
+            await writer.drain()
+            await _read_reply(reader)
+        return reader, writer
+
+    async def start(self) -> None:
+        self._reader_task = asyncio.create_task(self._listen())
+        await asyncio.wait_for(self._subscribed.wait(), timeout=5)
+
+    async def stop(self) -> None:
+        if self._reader_task:
+            self._reader_task.cancel()
+            try:
+                await self._reader_task
+            except asyncio.CancelledError:
+                pass
+            self._reader_task = None
+        if self._publisher:
+            self._publisher[1].close()
+            self._publisher = None
+
+    async def publish(self, topic: str, message: dict) -> None:
+        data = json.dumps(message, default=str)
+        async with self._publish_lock:
+            for attempt in range(2):
+                try:
+                    if self._publisher is None:
+                        self._publisher = await self._connect()
+                    reader, writer = self._publisher
+                    writer.write(_encode_command("PUBLISH", self.prefix + topic, data))
+                    await writer.drain()
+                    await _read_reply(reader)
+                    self.published += 1
+                    return
+                except (ConnectionError, OSError):
+                    self._publisher = None
+                    if attempt:
+                        raise
+
+    async def _listen(self) -> None:
+        delay = 0.5
+        while True:
+            writer = None
+            try:
+                reader, writer = await self._connect()
+                channels = [self.prefix + topic for topic in self._handlers] or [self.prefix + "_"]
+                writer.write(_encode_command("SUBSCRIBE", *channels))
+                await writer.drain()
+                for _ in channels:
+                    await _read_reply(reader)
+                self._subscribed.set()
+                delay = 0.5
+                while True:
+                    reply = await _read_reply(reader)
+                    if isinstance(reply, list) and len(reply) == 3 and reply[0] == b"message":
+                        # A resposta já foi lida por inteiro: uma falha ao
+                        # decodificar ou processar a mensagem a descarta sem
+                        # afetar a conexão.
+                        try:
+                            topic = reply[1].decode()[len(self.prefix):]
+                            await self._dispatch(topic, json.loads(reply[2]))
+                        except Exception:
+                            logger.exception("Falha ao processar mensagem do backplane")
+            except asyncio.CancelledError:
+                raise
+            except (ConnectionError, OSError, asyncio.IncompleteReadError):
+                logger.warning("Backplane desconectado; nova tentativa em %.1fs", delay)
+                self.reconnects += 1
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 10)
+            except Exception:
+                # Qualquer outra falha (ex.: resposta malformada) deixa a
+                # leitura do stream em estado incerto: reconecta.
+                logger.exception("Falha na conexão do backplane; nova tentativa em %.1fs", delay)
+                self.reconnects += 1
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 10)
+            finally:
+                if writer is not None:
+                    writer.close()
+
+    def stats(self) -> dict:
+        data = super().stats()
+        data.update({"url": f"redis://{self.host}:{self.port}", "reconnects": self.reconnects})
+        return data
+
+
+# --- Servidor Local Compatível (stand-in) ---
+# Implementa o subconjunto do protocolo usado pelo RedisBackplane (PING,
+# PUBLISH, SUBSCRIBE, UNSUBSCRIBE, AUTH). Destinado a desenvolvimento e testes
+# com vários workers em uma mesma máquina, sem instalar o Redis.
+class LocalBroker:
+    def __init__(self, host: str = "127.0.0.1", port: int = 6379):
+        self.host = host
+        self.port = port
+        self._channels: dict[bytes, set[asyncio.StreamWriter]] = {}
+        self._server: asyncio.base_events.Server | None = None
+
+    async def start(self) -> None:
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def stop(self) -> None:
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        subscriptions: set[bytes] = set()
+        try:
+            while True:
+                command = await _read_reply(reader)
+                if not isinstance(command, list) or not command:
+                    break
+                name = command[0].upper()
+                if name == b"PUBLISH":
+                    receivers = list(self._channels.get(command[1], ()))
+                    frame = _encode_command("message", command[1], command[2])
+                    for receiver in receivers:
+                        receiver.write(frame)
+                    writer.write(b":%d\r\n" % len(receivers))
+                elif name == b"SUBSCRIBE":
+                    for channel in command[1:]:
+                        self._channels.setdefault(channel, set()).add(writer)
+                        subscriptions.add(channel)
+                        writer.write(b"*3\r\n$9\r\nsubscribe\r\n$%d\r\n%s\r\n:%d\r\n" % (len(channel), channel, len(subscriptions)))
+                elif name == b"UNSUBSCRIBE":
+                    for channel in command[1:] or list(subscriptions):
+                        self._channels.get(channel, set()).discard(writer)
+                        subscriptions.discard(channel)
+                        writer.write(b"*3\r\n$11\r\nunsubscribe\r\n$%d\r\n%s\r\n:%d\r\n" % (len(channel), channel, len(subscriptions)))
+                elif name in (b"PING", b"AUTH"):
+                    writer.write(b"+OK\r\n" if name == b"AUTH" else b"+PONG\r\n")
+                else:
+                    writer.write(b"-ERR unknown command\r\n")
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            for channel in subscriptions:
+                self._channels.get(channel, set()).discard(writer)
+            writer.close()
+
+
+# --- Fábrica e Instância Global ---
+def create_backplane(backend: str, url: str) -> Backplane:
+    if backend == "redis":
+        return RedisBackplane(url)
+    return InMemoryBackplane()
+
+backplane = create_backplane(settings.BROADCAST_BACKEND, settings.BROADCAST_URL)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Servidor pub/sub local compatível com o backplane Redis")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6379)
+    args = parser.parse_args(argv)
+
+    async def serve():
+        broker = LocalBroker(args.host, args.port)
+        await broker.start()
+        print(f"Backplane local escutando em redis://{broker.host}:{broker.port}")
+        await asyncio.Event().wait()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
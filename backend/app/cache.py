@@ -0,0 +1,111 @@
+# ---------------- CACHE EM MEMÓRIA (TTL) ---------------- #
+"""
+Este arquivo, cache.py, implementa um cache em memória, limitado em tamanho e
+com tempo de expiração (TTL) por entrada. Ele é usado para evitar consultas
+repetidas ao banco de dados em caminhos quentes da aplicação, como a
+autenticação de cada requisição.
+
+Características:
+- Tamanho máximo com descarte LRU (a entrada menos usada sai primeiro).
+- TTL global, que pode ser reduzido por entrada (ex.: expiração da sessão).
+- "Tags" opcionais para invalidar várias chaves de uma vez (ex.: todos os
+  tokens de um mesmo usuário).
+- Contadores de acertos (hits), falhas (misses) e descartes para métricas.
+- Seguro para uso concorrente (threadpool do FastAPI + event loop).
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable
+
+
+class TTLCache:
+    def __init__(self, maxsize: int = 1024, ttl: float = 60.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple[float, Any, Hashable | None]]" = OrderedDict()
+        self._tags: dict[Hashable, set[Hashable]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    # --- Operações Básicas ---
+    # `get` devolve None tanto para chaves ausentes quanto expiradas; por isso
+    # o cache não deve armazenar None como valor.
+    def get(self, key: Hashable) -> Any:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, value, _ = entry
+            if expires_at <= now:
+                self._remove(key)
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: float | None = None, tag: Hashable | None = None) -> None:
+        if self.maxsize <= 0 or self.ttl <= 0:
+            return
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        if ttl <= 0:
+            return
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+            self._data[key] = (time.monotonic() + ttl, value, tag)
+            if tag is not None:
+                self._tags.setdefault(tag, set()).add(key)
+            while len(self._data) > self.maxsize:
+                oldest = next(iter(self._data))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def pop(self, key: Hashable) -> None:
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+                self.invalidations += 1
+
+    def invalidate_tag(self, tag: Hashable) -> None:
+        with self._lock:
+            for key in list(self._tags.get(tag, ())):
+                self._remove(key)
+                self.invalidations += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._tags.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+    # --- Função Interna ---
+    # Remove a chave do mapa principal e do índice de tags. Deve ser chamada
+    # com o lock já adquirido.
+    def _remove(self, key: Hashable) -> None:
+        _, _, tag = self._data.pop(key)
+        if tag is not None:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
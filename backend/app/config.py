@@ -22,5 +22,60 @@ class Settings:
     SECRET_KEY: str = os.getenv("SECRET_KEY", "uma-chave-secreta-padrao")
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "60"))
+    # Cache de autenticação (token -> usuário/sessão). TTL 0 desativa o cache.
+    AUTH_CACHE_TTL_SECONDS: float = float(os.getenv("AUTH_CACHE_TTL_SECONDS", "60"))
+    AUTH_CACHE_MAX_SIZE: int = int(os.getenv("AUTH_CACHE_MAX_SIZE", "10000"))
+    # Cache das rotas das conversas (participantes + subcanal padrão).
+    CONVERSATION_ROUTE_CACHE_TTL_SECONDS: float = float(os.getenv("CONVERSATION_ROUTE_CACHE_TTL_SECONDS", "60"))
+    CONVERSATION_ROUTE_CACHE_MAX_SIZE: int = int(os.getenv("CONVERSATION_ROUTE_CACHE_MAX_SIZE", "10000"))
+    # Backplane de broadcast entre workers: "memory" (1 processo) ou "redis".
+    BROADCAST_BACKEND: str = os.getenv("BROADCAST_BACKEND", "memory")
+    BROADCAST_URL: str = os.getenv("BROADCAST_URL", "redis://127.0.0.1:6379/0")
+    # Tamanho máximo da fila de eventos em tempo real (dispatch.py).
+    DISPATCH_QUEUE_SIZE: int = int(os.getenv("DISPATCH_QUEUE_SIZE", "10000"))
+    # Usuários atendidos por lote no fan-out de notificações para todos os
+    # conectados (entre lotes o event loop atende outras tarefas).
+    NOTIFY_FANOUT_BATCH_SIZE: int = int(os.getenv("NOTIFY_FANOUT_BATCH_SIZE", "500"))
+    # Caixa de entrada de notificações: fila do gravador em lote, tamanho
+    # máximo de cada INSERT em massa e notificações pendentes entregues ao
+    # conectar (o restante fica disponível em GET /notifications).
+    NOTIFICATION_QUEUE_SIZE: int = int(os.getenv("NOTIFICATION_QUEUE_SIZE", "10000"))
+    NOTIFICATION_BATCH_SIZE: int = int(os.getenv("NOTIFICATION_BATCH_SIZE", "500"))
+    NOTIFICATION_REPLAY_LIMIT: int = int(os.getenv("NOTIFICATION_REPLAY_LIMIT", "50"))
+    # Gravação em lote das mensagens dos chats (group commit), desligada por
+    # padrão: espera máxima para juntar mensagens, tamanho máximo do lote e
+    # mensagens aguardando gravação.
+    MESSAGE_GROUP_COMMIT: bool = os.getenv("MESSAGE_GROUP_COMMIT", "0").lower() in ("1", "true", "yes")
+    MESSAGE_BATCH_DELAY_MS: float = float(os.getenv("MESSAGE_BATCH_DELAY_MS", "5"))
+    MESSAGE_BATCH_SIZE: int = int(os.getenv("MESSAGE_BATCH_SIZE", "200"))
+    MESSAGE_QUEUE_SIZE: int = int(os.getenv("MESSAGE_QUEUE_SIZE", "5000"))
+    # Fila de saída por conexão WebSocket; ao estourar, o cliente é desconectado.
+    WS_SEND_QUEUE_SIZE: int = int(os.getenv("WS_SEND_QUEUE_SIZE", "256"))
+    # Heartbeat dos WebSockets: o servidor envia {"type": "ping"} a cada
+    # WS_HEARTBEAT_SECONDS e fecha conexões sem nenhum frame do cliente por
+    # WS_IDLE_TIMEOUT_SECONDS (conexões TCP meio abertas, ex.: celulares).
+    WS_HEARTBEAT_SECONDS: float = float(os.getenv("WS_HEARTBEAT_SECONDS", "25"))
+    WS_IDLE_TIMEOUT_SECONDS: float = float(os.getenv("WS_IDLE_TIMEOUT_SECONDS", "60"))
+    # Máximo de chats assinados por conexão no WebSocket multiplexado (/ws).
+    WS_MAX_SUBSCRIPTIONS: int = int(os.getenv("WS_MAX_SUBSCRIPTIONS", "500"))
+    # Presença: intervalo dos frames de mudanças e frequência (em ciclos) dos
+    # snapshots completos trocados entre workers. Digitação: publicações por
+    # segundo, no máximo, para cada chat.
+    PRESENCE_INTERVAL_SECONDS: float = float(os.getenv("PRESENCE_INTERVAL_SECONDS", "2"))
+    PRESENCE_SNAPSHOT_EVERY: int = int(os.getenv("PRESENCE_SNAPSHOT_EVERY", "15"))
+    TYPING_RATE_HZ: float = float(os.getenv("TYPING_RATE_HZ", "3"))
+    # Busca nas mensagens: ocorrências mais recentes lidas por termo da consulta.
+    SEARCH_MAX_CANDIDATES: int = int(os.getenv("SEARCH_MAX_CANDIDATES", "1000"))
+    # Arquivamento: idade (em dias) a partir da qual as mensagens são movidas
+    # para MessageArchive e mensagens movidas por lote/transação.
+    MESSAGE_ARCHIVE_AFTER_DAYS: int = int(os.getenv("MESSAGE_ARCHIVE_AFTER_DAYS", "180"))
+    MESSAGE_ARCHIVE_BATCH_SIZE: int = int(os.getenv("MESSAGE_ARCHIVE_BATCH_SIZE", "1000"))
+    # Linhas lidas do banco por lote no export do histórico das conversas.
+    EXPORT_BATCH_SIZE: int = int(os.getenv("EXPORT_BATCH_SIZE", "1000"))
+    # Buffer de replay por chat (eventos recentes para reconexões).
+    REPLAY_BUFFER_SIZE: int = int(os.getenv("REPLAY_BUFFER_SIZE", "200"))
+    REPLAY_MAX_CHATS: int = int(os.getenv("REPLAY_MAX_CHATS", "5000"))
+    # Máximo de mensagens reenviadas do banco quando a lacuna excede o buffer.
+    REPLAY_DB_LIMIT: int = int(os.getenv("REPLAY_DB_LIMIT", "500"))
 
 settings = Settings()
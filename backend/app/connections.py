@@ -0,0 +1,207 @@
+# ---------------- CONEXÕES WEBSOCKET COM FILA DE ENVIO ---------------- #
+"""
+Este arquivo, connections.py, define o `ClientConnection`, um invólucro em
+torno de cada WebSocket com uma fila de saída limitada e uma task escritora
+dedicada. O formato (JSON ou MessagePack) é negociado por conexão, e os
+eventos chegam como `Frame`, serializados uma única vez por broadcast.
+
+O broadcast apenas enfileira (`offer`) o evento em cada conexão, sem aguardar
+o envio; assim um cliente lento (ex.: celular com rede ruim) não atrasa os
+demais destinatários. Se a fila de um cliente enche, ele é desconectado com o
+código `CLOSE_SLOW_CONSUMER` e precisa reconectar.
+
+Heartbeat: o `HeartbeatMonitor` envia periodicamente `{"type": "ping"}` às
+conexões com heartbeat, e `ClientConnection.receive()` fecha com
+`CLOSE_IDLE_TIMEOUT` a conexão que passa `idle_timeout` segundos sem enviar
+nenhum frame. Sem isso, uma conexão TCP meio aberta (ex.: celular que perdeu
+a rede) fica bloqueada em `receive()` indefinidamente e continua recebendo
+broadcasts. O cliente deve responder aos pings com qualquer frame.
+
+As métricas agregadas (conexões ativas, itens enfileirados, enviados,
+descartados, desconexões e tamanho das filas) ficam em `connection_stats()`.
+"""
+import asyncio
+import logging
+import os
+import weakref
+from typing import Callable
+
+from fastapi import WebSocket, WebSocketDisconnect
+
+from .config import settings
+from .framing import ENCODING_JSON, ENCODING_MSGPACK, Frame
+
+logger = logging.getLogger(__name__)
+
+# Códigos de fechamento (faixa 4000-4999, reservada à aplicação).
+CLOSE_SLOW_CONSUMER = 4008
+CLOSE_IDLE_TIMEOUT = 4009
+
+_live_connections: "weakref.WeakSet[ClientConnection]" = weakref.WeakSet()
+_counters = {"enqueued": 0, "sent": 0, "dropped": 0, "evicted": 0, "send_errors": 0, "idle_closed": 0, "pings": 0}
+
+
+class ClientConnection:
+    def __init__(
+        self,
+        websocket: WebSocket,
+        encoding: str = ENCODING_JSON,
+        max_queue: int = settings.WS_SEND_QUEUE_SIZE,
+        heartbeat: bool = True,
+        idle_timeout: float | None = settings.WS_IDLE_TIMEOUT_SECONDS,
+        user_id: int | None = None,
+    ):
+        self.websocket = websocket
+        self.user_id = user_id
+        self.encoding = encoding
+        self.heartbeat = heartbeat
+        self.idle_timeout = idle_timeout
+        self.queue: asyncio.Queue = asyncio.Queue(max_queue)
+        self.closed = False
+        self._writer: asyncio.Task | None = None
+        self._closing: asyncio.Task | None = None
+        self._held: list[Frame] | None = None
+        # Chamado pela task escritora depois de cada frame efetivamente enviado.
+        self.on_sent: "Callable[[Frame], None] | None" = None
+        # Chamado com o chat_id quando o usuário deixa de participar de um
+        # chat assinado (ver chat_ws.py); sem handler, a conexão é fechada.
+        self.on_revoke: "Callable[[int], None] | None" = None
+        _live_connections.add(self)
+
+    def start(self) -> None:
+        self._writer = asyncio.create_task(self._write_loop())
+
+    # --- Enfileiramento (não bloqueante) ---
+    # Aceita um `Frame` (serializado uma vez e compartilhado entre conexões)
+    # ou um dict. Retorna False quando a conexão já está fechada ou a fila
+    # estourou; neste último caso a conexão é encerrada como consumidor lento.
+    def offer(self, payload: "Frame | dict") -> bool:
+        if self.closed:
+            return False
+        if not isinstance(payload, Frame):
+            payload = Frame(payload)
+        if self._held is not None:
+            if len(self._held) >= self.queue.maxsize:
+                _counters["dropped"] += 1
+                self._evict()
+                return False
+            self._held.append(payload)
+            return True
+        try:
+            self.queue.put_nowait(payload)
+        except asyncio.QueueFull:
+            _counters["dropped"] += 1
+            self._evict()
+            return False
+        _counters["enqueued"] += 1
+        return True
+
+    # --- Retenção Temporária ---
+    # Enquanto a conexão recupera do banco os eventos perdidos (um `await`
+    # depois do registro no chat), os eventos ao vivo ficam retidos; quem
+    # chamou `hold()` os recebe de `release()` e decide a ordem de envio.
+    def hold(self) -> None:
+        self._held = []
+
+    def release(self) -> list[Frame]:
+        held, self._held = self._held or [], None
+        return held
+
+    def _evict(self) -> None:
+        _counters["evicted"] += 1
+        logger.info("Desconectando consumidor lento (fila com %d itens)", self.queue.qsize())
+        self.closed = True
+        if self._writer is not None:
+            self._writer.cancel()
+        self._closing = asyncio.get_running_loop().create_task(self._close_socket(CLOSE_SLOW_CONSUMER, "slow consumer"))
+
+    # --- Task Escritora ---
+    async def _write_loop(self) -> None:
+        while True:
+            frame = await self.queue.get()
+            try:
+                if self.encoding == ENCODING_MSGPACK:
+                    await self.websocket.send_bytes(frame.binary)
+                else:
+                    await self.websocket.send_text(frame.text)
+                _counters["sent"] += 1
+                if self.on_sent is not None:
+                    self.on_sent(frame)
+            except Exception:
+                _counters["send_errors"] += 1
+                self.closed = True
+                return
+
+    # --- Leitura com Timeout de Inatividade ---
+    # Retorna a mensagem ASGI recebida (texto ou bytes). Desconexões e o
+    # timeout de inatividade são sinalizados com WebSocketDisconnect.
+    async def receive(self) -> dict:
+        try:
+            message = await asyncio.wait_for(self.websocket.receive(), self.idle_timeout)
+        except asyncio.TimeoutError:
+            _counters["idle_closed"] += 1
+            await self.close(CLOSE_IDLE_TIMEOUT, "idle timeout")
+            raise WebSocketDisconnect(CLOSE_IDLE_TIMEOUT)
+        if message["type"] == "websocket.disconnect":
+            raise WebSocketDisconnect(message.get("code", 1000))
+        return message
+
+    async def close(self, code: int = 1000, reason: str | None = None) -> None:
+        if self._writer is not None:
+            self._writer.cancel()
+        if self.closed:
+            return
+        self.closed = True
+        await self._close_socket(code, reason)
+
+    async def _close_socket(self, code: int, reason: str | None) -> None:
+        try:
+            await self.websocket.close(code=code, reason=reason)
+        except Exception:
+            pass
+
+
+# --- Heartbeat ---
+# Uma única task por worker envia o mesmo frame de ping (serializado uma vez)
+# a todas as conexões abertas com heartbeat habilitado.
+class HeartbeatMonitor:
+    def __init__(self, interval: float = 25.0):
+        self.interval = interval
+        self._task: asyncio.Task | None = None
+
+    async def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            frame = Frame({"type": "ping"})
+            for conn in list(_live_connections):
+                if conn.heartbeat and conn.offer(frame):
+                    _counters["pings"] += 1
+
+
+heartbeat = HeartbeatMonitor(interval=settings.WS_HEARTBEAT_SECONDS)
+
+
+def connection_stats() -> dict:
+    connections = list(_live_connections)
+    open_connections = [conn for conn in connections if not conn.closed]
+    queue_lengths = [conn.queue.qsize() for conn in open_connections]
+    return {
+        "pid": os.getpid(),
+        "open": len(open_connections),
+        "queued_total": sum(queue_lengths),
+        "queued_max": max(queue_lengths, default=0),
+        **_counters,
+    }
@@ -0,0 +1,124 @@
+# ---------------- CACHE DE ROTAS DAS CONVERSAS ---------------- #
+"""
+Este arquivo, conversation_routes.py, mantém em cache a "rota" de cada
+conversa: o conjunto de ids dos participantes e o id do subcanal padrão
+(Conversation → Channel → Subchannel) em que as mensagens são gravadas.
+
+Sem o cache, cada envio ou leitura de mensagens repetia a mesma cadeia de
+consultas (conversa, participantes, canal, subcanal) antes do trabalho real.
+Com a rota em cache, a verificação de participação é uma busca em um `set`
+e o envio vai direto ao INSERT da mensagem.
+
+Invalidação:
+- Código que altera os participantes de uma conversa ou os canais/subcanais
+  dela deve chamar `invalidate_route(chat_id)` após o commit.
+- A invalidação é publicada no backplane (tópico `conversation_routes`) para
+  que os outros workers também descartem a rota.
+- O TTL (`CONVERSATION_ROUTE_CACHE_TTL_SECONDS`) limita o tempo de uma rota
+  desatualizada caso alguma alteração não passe por `invalidate_route`.
+"""
+import logging
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import models
+from .backplane import backplane
+from .cache import TTLCache
+from .config import settings
+from .db import AsyncSessionLocal
+from .dispatch import dispatcher
+
+logger = logging.getLogger(__name__)
+
+ROUTES_TOPIC = "conversation_routes"
+
+
+class ConversationRoute:
+    __slots__ = ("chat_id", "participant_ids", "subchannel_id")
+
+    def __init__(self, chat_id: int, participant_ids: frozenset[int], subchannel_id: int | None):
+        self.chat_id = chat_id
+        self.participant_ids = participant_ids
+        # None enquanto a conversa não tiver canal/subcanal (criados no primeiro envio).
+        self.subchannel_id = subchannel_id
+
+    def is_participant(self, user_id: int) -> bool:
+        return user_id in self.participant_ids
+
+
+route_cache = TTLCache(maxsize=settings.CONVERSATION_ROUTE_CACHE_MAX_SIZE, ttl=settings.CONVERSATION_ROUTE_CACHE_TTL_SECONDS)
+
+
+# --- Carregamento ---
+# Uma única consulta traz a conversa, os participantes (uma linha por
+# participante) e o subcanal padrão: o primeiro subcanal do primeiro canal da
+# conversa, por id.
+async def _load_route(db: AsyncSession, chat_id: int) -> ConversationRoute | None:
+    cp = models.conversation_participants
+    first_channel = (
+        select(models.Channel.id)
+        .where(models.Channel.conversationId == chat_id)
+        .order_by(models.Channel.id)
+        .limit(1)
+        .scalar_subquery()
+    )
+    default_subchannel = (
+        select(models.Subchannel.id)
+        .where(models.Subchannel.parentChannelId == first_channel)
+        .order_by(models.Subchannel.id)
+        .limit(1)
+        .scalar_subquery()
+    )
+    rows = (await db.execute(
+        select(default_subchannel, cp.c.userId)
+        .select_from(models.Conversation)
+        .outerjoin(cp, cp.c.conversationId == models.Conversation.id)
+        .where(models.Conversation.id == chat_id)
+    )).all()
+    if not rows:
+        return None
+    participant_ids = frozenset(user_id for _, user_id in rows if user_id is not None)
+    return ConversationRoute(chat_id, participant_ids, rows[0][0])
+
+
+async def get_route(chat_id: int, db: AsyncSession | None = None) -> ConversationRoute | None:
+    """
+    Rota da conversa, ou None se ela não existir. Em caso de falha no cache,
+    consulta o banco com a sessão informada ou com uma sessão de curta duração.
+    """
+    route = route_cache.get(chat_id)
+    if route is not None:
+        return route
+    if db is None:
+        async with AsyncSessionLocal() as session:
+            route = await _load_route(session, chat_id)
+    else:
+        route = await _load_route(db, chat_id)
+    if route is not None:
+        route_cache.set(chat_id, route)
+    return route
+
+
+def remember_subchannel(route: ConversationRoute, subchannel_id: int) -> ConversationRoute:
+    """Guarda o subcanal padrão criado no primeiro envio de uma conversa."""
+    route = ConversationRoute(route.chat_id, route.participant_ids, subchannel_id)
+    route_cache.set(route.chat_id, route)
+    return route
+
+
+# --- Invalidação ---
+# Pode ser chamada de rotas síncronas (threadpool): a remoção local é
+# imediata e o aviso aos outros workers passa pelo dispatcher thread-safe.
+def invalidate_route(chat_id: int | None) -> None:
+    if chat_id is None:
+        return
+    route_cache.pop(chat_id)
+    dispatcher.emit(ROUTES_TOPIC, {"chat_id": chat_id})
+
+
+async def _on_invalidate(message: dict) -> None:
+    route_cache.pop(message["chat_id"])
+
+
+backplane.subscribe(ROUTES_TOPIC, _on_invalidate)
@@ -4,8 +4,14 @@ Este arquivo, db.py, é responsável por configurar a conexão com o banco de
 dados usando SQLAlchemy. Ele lê a URL de conexão de um arquivo .env para
 segurança, cria o "motor" (engine) de conexão e define uma função (get_db)
 para fornecer sessões de banco de dados para as rotas da API.
+
+Além do engine síncrono (pymysql), também é criado um engine assíncrono
+(aiomysql em produção, aiosqlite para testes locais) com a dependência
+`get_async_db`, usada pelas rotas mais acessadas para não ocupar uma thread
+do threadpool durante cada consulta.
 """
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 import os
@@ -27,10 +33,42 @@ engine = create_engine(
     echo=True  # Debug - remover em produção
 )
 
+# --- Engine Assíncrono ---
+# A URL assíncrona pode ser definida em ASYNC_DATABASE_URL; caso contrário é
+# derivada de DATABASE_URL trocando o driver (pymysql -> aiomysql,
+# pysqlite -> aiosqlite). O SQLite não aceita os parâmetros de pool do MySQL.
+def _to_async_url(url: str) -> str:
+    if url.startswith("mysql+pymysql://"):
+        return "mysql+aiomysql://" + url[len("mysql+pymysql://"):]
+    if url.startswith("mysql://"):
+        return "mysql+aiomysql://" + url[len("mysql://"):]
+    if url.startswith("sqlite+pysqlite://"):
+        return "sqlite+aiosqlite://" + url[len("sqlite+pysqlite://"):]
+    if url.startswith("sqlite://"):
+        return "sqlite+aiosqlite://" + url[len("sqlite://"):]
+    return url
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL", _to_async_url(DATABASE_URL))
+
+_async_pool_options = {} if ASYNC_DATABASE_URL.startswith("sqlite") else {
+    "pool_pre_ping": True,
+    "pool_size": 10,
+    "max_overflow": 20,
+}
+
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    echo=True,  # Debug - remover em produção
+    **_async_pool_options,
+)
+
 # --- Sessão e Base Declarativa ---
 # SessionLocal é uma fábrica de sessões. Cada instância sua será uma sessão.
 # Base é a classe da qual todos os modelos ORM (tabelas) irão herdar.
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# `expire_on_commit=False` evita recarregamentos implícitos (lazy I/O) depois do
+# commit, que não são permitidos em sessões assíncronas.
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
 Base = declarative_base()
 
 
@@ -43,4 +81,12 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+
+# --- Função de Dependência para Sessão Assíncrona ---
+# Equivalente assíncrono de get_db. O `async with` garante o fechamento da
+# sessão e a devolução da conexão ao pool ao fim da requisição.
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -0,0 +1,118 @@
+# ---------------- DESPACHO DE EVENTOS EM TEMPO REAL ---------------- #
+"""
+Este arquivo, dispatch.py, implementa o despachante de eventos usado pelas
+rotas para enviar eventos em tempo real (ex.: `message:new`) ao backplane.
+
+As rotas podem rodar no event loop (`async def`) ou no threadpool (`def`),
+onde não existe loop em execução e `asyncio.create_task` falha. O
+`EventDispatcher` resolve isso com uma fila thread-safe: `emit()` pode ser
+chamado de qualquer thread e apenas enfileira o evento; uma task no event
+loop consome a fila e publica cada evento no backplane.
+
+Métricas expostas em `/metrics`: profundidade da fila, eventos despachados,
+descartados, falhas e atraso (lag) entre o `emit()` e a publicação.
+"""
+import asyncio
+import logging
+import threading
+import time
+
+from .backplane import backplane
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class EventDispatcher:
+    def __init__(self, maxsize: int = 10000):
+        self.maxsize = maxsize
+        self._queue: asyncio.Queue | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._loop_thread: int | None = None
+        self._task: asyncio.Task | None = None
+        self.dispatched = 0
+        self.dropped = 0
+        self.errors = 0
+        self.lag_last_ms = 0.0
+        self.lag_max_ms = 0.0
+        self._lag_total_ms = 0.0
+
+    async def start(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        self._queue = asyncio.Queue(self.maxsize)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self, timeout: float = 5.0) -> None:
+        if self._task is None:
+            return
+        # Tenta entregar o que ainda está na fila antes de encerrar.
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Encerrando com %d eventos não despachados", self._queue.qsize())
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        self._loop = None
+
+    # --- Enfileiramento (qualquer thread) ---
+    # No próprio loop o evento entra direto na fila; a partir de outra thread
+    # (threadpool) a inserção é agendada com `call_soon_threadsafe`.
+    def emit(self, topic: str, message: dict) -> bool:
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            self.dropped += 1
+            logger.warning("Dispatcher não iniciado; evento do tópico %s descartado", topic)
+            return False
+        item = (time.monotonic(), topic, message)
+        if threading.get_ident() == self._loop_thread:
+            return self._enqueue(item)
+        loop.call_soon_threadsafe(self._enqueue, item)
+        return True
+
+    def _enqueue(self, item: tuple) -> bool:
+        try:
+            self._queue.put_nowait(item)
+            return True
+        except asyncio.QueueFull:
+            self.dropped += 1
+            logger.warning("Fila de eventos cheia; evento do tópico %s descartado", item[1])
+            return False
+
+    # --- Consumo (event loop) ---
+    async def _run(self) -> None:
+        while True:
+            enqueued_at, topic, message = await self._queue.get()
+            lag_ms = (time.monotonic() - enqueued_at) * 1000
+            self.lag_last_ms = lag_ms
+            self.lag_max_ms = max(self.lag_max_ms, lag_ms)
+            self._lag_total_ms += lag_ms
+            try:
+                await backplane.publish(topic, message)
+                self.dispatched += 1
+            except Exception:
+                self.errors += 1
+                logger.exception("Falha ao despachar evento do tópico %s", topic)
+            finally:
+                self._queue.task_done()
+
+    def stats(self) -> dict:
+        processed = self.dispatched + self.errors
+        return {
+            "running": self._task is not None,
+            "queue_depth": self._queue.qsize() if self._queue else 0,
+            "queue_maxsize": self.maxsize,
+            "dispatched": self.dispatched,
+            "dropped": self.dropped,
+            "errors": self.errors,
+            "lag_last_ms": round(self.lag_last_ms, 3),
+            "lag_max_ms": round(self.lag_max_ms, 3),
+            "lag_avg_ms": round(self._lag_total_ms / processed, 3) if processed else 0.0,
+        }
+
+
+dispatcher = EventDispatcher(maxsize=settings.DISPATCH_QUEUE_SIZE)
@@ -0,0 +1,81 @@
+# ---------------- SERIALIZAÇÃO DE EVENTOS (FRAMES) ---------------- #
+"""
+Este arquivo, framing.py, centraliza a serialização dos eventos enviados
+pelos WebSockets.
+
+Um `Frame` serializa o payload uma única vez por formato, e o mesmo texto
+(JSON) ou bytes (MessagePack) é reaproveitado por todas as conexões que
+recebem o evento. Antes, cada `send_json` executava um `json.dumps` por
+destinatário.
+
+Formatos:
+- `json` (padrão): texto, codificado com `orjson` quando instalado.
+- `msgpack`: binário e mais compacto, negociado pelo cliente via
+  subprotocolo (`Sec-WebSocket-Protocol: msgpack`) ou `?encoding=msgpack`.
+  Só é aceito se a biblioteca `msgpack` estiver instalada.
+"""
+import json
+
+from fastapi import WebSocket
+
+try:
+    import orjson
+except ImportError:  # dependência opcional
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # dependência opcional
+    msgpack = None
+
+ENCODING_JSON = "json"
+ENCODING_MSGPACK = "msgpack"
+
+
+def encode_json(payload) -> str:
+    if orjson is not None:
+        return orjson.dumps(payload, default=str).decode()
+    return json.dumps(payload, default=str, separators=(",", ":"), ensure_ascii=False)
+
+
+def encode_msgpack(payload) -> bytes:
+    return msgpack.packb(payload, default=str, use_bin_type=True)
+
+
+def decode_msgpack(data: bytes):
+    return msgpack.unpackb(data, raw=False)
+
+
+class Frame:
+    """Payload de um evento com serialização preguiçosa e memorizada."""
+    __slots__ = ("payload", "_text", "_binary")
+
+    def __init__(self, payload: dict):
+        self.payload = payload
+        self._text: str | None = None
+        self._binary: bytes | None = None
+
+    @property
+    def text(self) -> str:
+        if self._text is None:
+            self._text = encode_json(self.payload)
+        return self._text
+
+    @property
+    def binary(self) -> bytes:
+        if self._binary is None:
+            self._binary = encode_msgpack(self.payload)
+        return self._binary
+
+
+# --- Negociação do Formato ---
+# Retorna (encoding, subprotocolo a aceitar). O subprotocolo só é devolvido
+# quando o cliente o solicitou no handshake, como exige o protocolo.
+def negotiate_encoding(websocket: WebSocket) -> tuple[str, str | None]:
+    if msgpack is None:
+        return ENCODING_JSON, None
+    if ENCODING_MSGPACK in websocket.scope.get("subprotocols", []):
+        return ENCODING_MSGPACK, ENCODING_MSGPACK
+    if websocket.query_params.get("encoding") == ENCODING_MSGPACK:
+        return ENCODING_MSGPACK, None
+    return ENCODING_JSON, None
@@ -0,0 +1,115 @@
+# ---------------- CAIXA DE ENTRADA DE NOTIFICAÇÕES ---------------- #
+"""
+Este arquivo, inbox.py, implementa o gravador em lote (`NotificationWriter`)
+da caixa de entrada de notificações.
+
+Toda notificação é gravada na tabela `Notification` antes de ser publicada no
+backplane, para que usuários desconectados a recebam quando o socket
+conectar (ou pela rota REST `GET /notifications`). O gravador é um
+`EventDispatcher` que consome a fila em lotes: as notificações acumuladas
+enquanto o lote anterior era gravado viram um único INSERT em massa, e uma
+rajada de anúncios não gera um INSERT síncrono por destinatário na rota.
+
+Cada notificação tem um id crescente, enviado ao cliente em
+`notification_id`. Anúncios (para todos) são gravados uma única vez com
+`broadcast=True`; as demais têm uma linha em `NotificationRecipient` por
+destinatário.
+"""
+import logging
+import time
+
+from sqlalchemy import insert
+
+from . import models
+from .backplane import backplane
+from .config import settings
+from .db import AsyncSessionLocal
+from .dispatch import EventDispatcher
+from .framing import encode_json
+
+logger = logging.getLogger(__name__)
+
+
+class NotificationWriter(EventDispatcher):
+    def __init__(self, maxsize: int = 10000, batch_size: int = 500):
+        super().__init__(maxsize)
+        self.batch_size = batch_size
+        self.written = 0
+        self.batches = 0
+        self.write_errors = 0
+
+    # --- Consumo em Lotes ---
+    # Aguarda o primeiro item e junta os que já estiverem na fila (sem espera
+    # artificial): com pouco tráfego cada notificação sai imediatamente, sob
+    # rajadas os lotes crescem até `batch_size`.
+    async def _run(self) -> None:
+        while True:
+            batch = [await self._queue.get()]
+            while len(batch) < self.batch_size and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            # Atraso medido pelo item mais antigo do lote.
+            lag_ms = (time.monotonic() - batch[0][0]) * 1000
+            self.lag_last_ms = lag_ms
+            self.lag_max_ms = max(self.lag_max_ms, lag_ms)
+            self._lag_total_ms += lag_ms * len(batch)
+            try:
+                await self._write_and_publish(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    async def _write_and_publish(self, batch: list[tuple]) -> None:
+        ids = await self._write(batch)
+        for (enqueued_at, topic, envelope), notification_id in zip(batch, ids):
+            if notification_id is not None:
+                envelope = {**envelope, "message": {**envelope["message"], "notification_id": notification_id}}
+            try:
+                await backplane.publish(topic, envelope)
+                self.dispatched += 1
+            except Exception:
+                self.errors += 1
+                logger.exception("Falha ao publicar notificação")
+
+    async def _write(self, batch: list[tuple]) -> list[int | None]:
+        # Em caso de falha no banco, as notificações ainda são entregues em
+        # tempo real (sem id), apenas não ficam na caixa de entrada.
+        try:
+            async with AsyncSessionLocal() as db:
+                rows = [
+                    models.Notification(
+                        type=str(envelope["message"].get("type", "notification")),
+                        payload=encode_json(envelope["message"]),
+                        broadcast=bool(envelope.get("connected")),
+                    )
+                    for _, _, envelope in batch
+                ]
+                db.add_all(rows)
+                await db.flush()
+                recipients = [
+                    {"notificationId": row.id, "userId": user_id}
+                    for row, (_, _, envelope) in zip(rows, batch)
+                    for user_id in set(envelope.get("user_ids") or ())
+                ]
+                if recipients:
+                    await db.execute(insert(models.NotificationRecipient), recipients)
+                await db.commit()
+        except Exception:
+            self.write_errors += 1
+            logger.exception("Falha ao gravar %d notificações", len(batch))
+            return [None] * len(batch)
+        self.written += len(rows)
+        self.batches += 1
+        return [row.id for row in rows]
+
+    def stats(self) -> dict:
+        data = super().stats()
+        data.update({
+            "written": self.written,
+            "batches": self.batches,
+            "avg_batch_size": round(self.written / self.batches, 2) if self.batches else 0.0,
+            "write_errors": self.write_errors,
+        })
+        return data
+
+
+inbox_writer = NotificationWriter(maxsize=settings.NOTIFICATION_QUEUE_SIZE, batch_size=settings.NOTIFICATION_BATCH_SIZE)
@@ -1,20 +1,52 @@
 # ---------------- ARQUIVO PRINCIPAL DA APLICAÇÃO  ---------------- #
+from contextlib import asynccontextmanager
 from datetime import datetime
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from starlette.middleware.gzip import GZipMiddleware
-from .routers import auth, users, events, groups, publications, chat, chat_ws, channel, subchannel
-from .db import Base, engine
+from .routers import auth, users, events, groups, publications, chat, chat_ws, channel, subchannel, notifications, realtime
+from .backplane import backplane
+from .connections import connection_stats, heartbeat
+from .conversation_routes import route_cache
+from .replay import replay_buffer
+from .dispatch import dispatcher
+from .inbox import inbox_writer
+from .message_writer import message_writer
+from .presence import presence
+from .db import Base, engine, async_engine
+from . import utils
 
 # Criar tabelas
 Base.metadata.create_all(bind=engine)
 
+# Ciclo de vida: conecta o backplane de broadcast e inicia o despachante de
+# eventos e os gravadores em lote (mensagens, se ativado, e notificações) na
+# inicialização do worker; no
+# encerramento esvazia as filas e libera as conexões.
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await backplane.start()
+    await dispatcher.start()
+    await message_writer.start()
+    await inbox_writer.start()
+    await presence.start()
+    await heartbeat.start()
+    yield
+    await heartbeat.stop()
+    await presence.stop()
+    await inbox_writer.stop()
+    await message_writer.stop()
+    await dispatcher.stop()
+    await backplane.stop()
+    await async_engine.dispose()
+
 # Instanciar FastAPI
 app = FastAPI(
     title="UCONNECT API",
     version="1.0.0",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    lifespan=lifespan,
 )
 
 # OTIMIZAÇÃO 1: Adicionar compressão GZIP
@@ -51,6 +83,8 @@ app.include_router(chat.router)
 app.include_router(chat_ws.router)
 app.include_router(channel.router)
 app.include_router(subchannel.router)
+app.include_router(notifications.router)
+app.include_router(realtime.router)
 
 # Rotas básicas
 @app.get("/")
@@ -64,4 +98,20 @@ def root():
 @app.get("/health")
 def health_check():
     return {"status": "healthy", "timestamp": datetime.utcnow()}
+
+# Métricas internas do processo (caches, filas, conexões)
+@app.get("/metrics")
+def metrics():
+    return {
+        "auth_cache": utils.auth_cache.stats(),
+        "conversation_routes": route_cache.stats(),
+        "backplane": backplane.stats(),
+        "dispatcher": dispatcher.stats(),
+        "messages": message_writer.stats(),
+        "notifications": inbox_writer.stats(),
+        "websockets": connection_stats(),
+        "chat_connections": chat_ws.chat_connection_stats(),
+        "replay": replay_buffer.stats(),
+        "presence": presence.stats(),
+    }
     
\ No newline at end of file
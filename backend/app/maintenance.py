@@ -0,0 +1,235 @@
+# ---------------- TAREFAS DE MANUTENÇÃO (CLI) ---------------- #
+"""
+Este arquivo, maintenance.py, reúne tarefas administrativas executadas fora
+do ciclo de requisições da API, como a reconstrução de dados desnormalizados.
+
+Uso:
+    python -m backend.app.maintenance rebuild-summaries
+    python -m backend.app.maintenance reindex-search
+    python -m backend.app.maintenance archive [--days 180] [--resume]
+    python -m backend.app.maintenance upgrade-schema
+"""
+import argparse
+import sys
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, func, insert, inspect, select, text
+from sqlalchemy.schema import CreateColumn
+
+from . import models, search
+from .config import settings
+from .db import Base, SessionLocal, engine
+from .message_writer import SUMMARY_PREVIEW_LENGTH
+
+
+# --- Tarefa: Reconstruir Resumos de Conversas ---
+# Recalcula `ConversationSummary` (última mensagem e contagem) a partir das
+# tabelas Message e MessageArchive. Útil para popular o resumo de conversas
+# antigas ou corrigir divergências. Processa as conversas em lotes para
+# limitar o uso de memória.
+def _conversation_stats(db, model) -> dict[int, tuple[int, int]]:
+    return {
+        conversation_id: (count, last_id)
+        for conversation_id, count, last_id in (
+            db.query(models.Channel.conversationId, func.count(model.id), func.max(model.id))
+            .join(models.Subchannel, models.Subchannel.parentChannelId == models.Channel.id)
+            .join(model, model.subchannelId == models.Subchannel.id)
+            .group_by(models.Channel.conversationId)
+        )
+    }
+
+
+def _last_messages(db, model, ids: list[int]) -> dict:
+    if not ids:
+        return {}
+    return {
+        message.id: (message, author_name)
+        for message, author_name in (
+            db.query(model, models.User.name)
+            .outerjoin(models.User, models.User.id == model.authorId)
+            .filter(model.id.in_(ids))
+        )
+    }
+
+
+def rebuild_conversation_summaries(db, batch_size: int = 500) -> int:
+    hot = _conversation_stats(db, models.Message)
+    archived = _conversation_stats(db, models.MessageArchive)
+    conversation_ids = sorted(hot.keys() | archived.keys())
+
+    db.query(models.ConversationSummary).delete(synchronize_session=False)
+
+    for start in range(0, len(conversation_ids), batch_size):
+        batch = conversation_ids[start:start + batch_size]
+        # A última mensagem está em Message, exceto em conversas só com arquivadas.
+        last_messages = _last_messages(db, models.Message, [hot[c][1] for c in batch if c in hot])
+        last_messages.update(_last_messages(db, models.MessageArchive, [archived[c][1] for c in batch if c not in hot]))
+        for conversation_id in batch:
+            count = hot.get(conversation_id, (0, None))[0] + archived.get(conversation_id, (0, None))[0]
+            last_id = (hot.get(conversation_id) or archived[conversation_id])[1]
+            message, author_name = last_messages[last_id]
+            db.add(models.ConversationSummary(
+                conversationId=conversation_id,
+                lastMessageId=message.id,
+                lastMessagePreview=message.content[:SUMMARY_PREVIEW_LENGTH],
+                lastAuthorId=message.authorId,
+                lastAuthorName=author_name,
+                lastMessageAt=message.timestamp,
+                messageCount=count,
+            ))
+        db.commit()
+    return len(conversation_ids)
+
+
+# --- Tarefa: Reconstruir o Índice de Busca ---
+# Apaga e recria a tabela MessageTerm a partir das mensagens, em lotes por id
+# (keyset), com um commit por lote. Necessário uma vez para indexar as
+# mensagens gravadas antes do índice existir; as novas são indexadas no envio.
+# Mensagens arquivadas não são indexadas (a busca cobre apenas Message).
+def reindex_search(db, batch_size: int = 1000) -> int:
+    db.query(models.MessageTerm).delete(synchronize_session=False)
+    db.commit()
+
+    total = 0
+    last_id = 0
+    while True:
+        rows = (
+            db.query(models.Message.id, models.Message.content, models.Channel.conversationId)
+            .join(models.Subchannel, models.Subchannel.id == models.Message.subchannelId)
+            .join(models.Channel, models.Channel.id == models.Subchannel.parentChannelId)
+            .filter(models.Message.id > last_id)
+            .order_by(models.Message.id)
+            .limit(batch_size)
+            .all()
+        )
+        if not rows:
+            return total
+        terms = [term for message_id, content, chat_id in rows for term in search.index_rows(chat_id, message_id, content)]
+        if terms:
+            db.execute(insert(models.MessageTerm), terms)
+        db.commit()
+        total += len(rows)
+        last_id = rows[-1][0]
+
+
+# --- Tarefa: Arquivar Mensagens Antigas ---
+# Move as mensagens anteriores à data de corte de Message para MessageArchive,
+# em lotes (menor id primeiro). Cada lote é uma transação: INSERT ... SELECT no
+# arquivo, remoção dos termos de busca e das linhas de Message, e avanço do
+# checkpoint. Interrompida, a tarefa não deixa mensagens duplicadas nem
+# perdidas; `resume` reaproveita a data de corte da execução não concluída.
+# A mensagem de maior id nunca é arquivada: em bancos que recalculam o
+# próximo id a partir do maior existente (SQLite criado sem AUTOINCREMENT,
+# MySQL anterior ao 8.0 após reiniciar), o id de uma mensagem arquivada
+# poderia ser reutilizado.
+ARCHIVE_CHECKPOINT = "messages"
+ARCHIVE_COLUMNS = ("id", "content", "subchannelId", "authorId", "timestamp")
+
+
+def archive_messages(db, older_than_days: int, batch_size: int = 1000, resume: bool = False, max_batches: int | None = None) -> int:
+    checkpoint = db.get(models.ArchiveCheckpoint, ARCHIVE_CHECKPOINT)
+    if checkpoint is None:
+        checkpoint = models.ArchiveCheckpoint(name=ARCHIVE_CHECKPOINT, lastMessageId=0, archivedCount=0)
+        db.add(checkpoint)
+    if not (resume and checkpoint.cutoff is not None and checkpoint.finishedAt is None):
+        checkpoint.cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+        checkpoint.finishedAt = None
+    db.commit()
+
+    columns = [getattr(models.Message, name) for name in ARCHIVE_COLUMNS]
+    moved = 0
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        newest_id = db.scalar(select(func.max(models.Message.id))) or 0
+        ids = db.scalars(
+            select(models.Message.id)
+            .where(models.Message.timestamp < checkpoint.cutoff, models.Message.id < newest_id)
+            .order_by(models.Message.id)
+            .limit(batch_size)
+        ).all()
+        if not ids:
+            checkpoint.finishedAt = datetime.utcnow()
+            db.commit()
+            break
+        db.execute(
+            insert(models.MessageArchive).from_select(list(ARCHIVE_COLUMNS), select(*columns).where(models.Message.id.in_(ids)))
+        )
+        db.execute(delete(models.MessageTerm).where(models.MessageTerm.messageId.in_(ids)))
+        db.execute(delete(models.Message).where(models.Message.id.in_(ids)))
+        checkpoint.lastMessageId = max(checkpoint.lastMessageId, ids[-1])
+        checkpoint.archivedCount += len(ids)
+        db.commit()
+        moved += len(ids)
+        batches += 1
+    return moved
+
+
+# --- Tarefa: Atualizar o Esquema ---
+# `create_all` (na inicialização da API) cria apenas as tabelas ausentes; não
+# altera tabelas que já existem. Esta tarefa cria as ausentes e acrescenta às
+# existentes as colunas e os índices declarados em models.py que ainda faltam
+# no banco, como Conversation_Participants.lastReadMessageId e
+# idx_conversation_participants_user. Só adiciona colunas que aceitam NULL
+# (as linhas existentes ficam sem valor); é segura para executar mais de uma vez.
+def upgrade_schema(bind=engine) -> list[str]:
+    applied = []
+    with bind.begin() as conn:
+        existing_tables = set(inspect(conn).get_table_names())
+        Base.metadata.create_all(conn)
+        for table in Base.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            inspector = inspect(conn)
+            columns = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in columns:
+                    continue
+                if not column.nullable:
+                    raise RuntimeError(f"Coluna obrigatória {table.name}.{column.name} ausente: migre manualmente")
+                ddl = CreateColumn(column).compile(dialect=conn.dialect)
+                conn.execute(text(f"ALTER TABLE {conn.dialect.identifier_preparer.format_table(table)} ADD COLUMN {ddl}"))
+                applied.append(f"coluna {table.name}.{column.name}")
+            indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name not in indexes:
+                    index.create(conn)
+                    applied.append(f"índice {index.name}")
+    return applied
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m backend.app.maintenance", description="Tarefas de manutenção do UCONNECT")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("rebuild-summaries", help="Reconstrói os resumos (última mensagem/contagem) das conversas")
+    commands.add_parser("reindex-search", help="Reconstrói o índice de busca das mensagens")
+    archive = commands.add_parser("archive", help="Move as mensagens antigas para MessageArchive")
+    archive.add_argument("--days", type=int, default=settings.MESSAGE_ARCHIVE_AFTER_DAYS, help="Idade mínima (em dias) das mensagens arquivadas")
+    archive.add_argument("--batch-size", type=int, default=settings.MESSAGE_ARCHIVE_BATCH_SIZE)
+    archive.add_argument("--max-batches", type=int, default=None, help="Encerra após N lotes (retome com --resume)")
+    archive.add_argument("--resume", action="store_true", help="Retoma a execução interrompida com a mesma data de corte")
+    commands.add_parser("upgrade-schema", help="Adiciona às tabelas existentes as colunas e os índices novos")
+    args = parser.parse_args(argv)
+
+    db = SessionLocal()
+    try:
+        if args.command == "rebuild-summaries":
+            total = rebuild_conversation_summaries(db)
+            print(f"{total} resumos de conversa reconstruídos.")
+        elif args.command == "reindex-search":
+            total = reindex_search(db)
+            print(f"{total} mensagens indexadas para busca.")
+        elif args.command == "archive":
+            total = archive_messages(db, args.days, args.batch_size, args.resume, args.max_batches)
+            print(f"{total} mensagens arquivadas.")
+        elif args.command == "upgrade-schema":
+            applied = upgrade_schema()
+            for change in applied:
+                print(f"Adicionado: {change}")
+            print(f"{len(applied)} alterações de esquema aplicadas.")
+    finally:
+        db.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
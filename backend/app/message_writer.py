@@ -0,0 +1,268 @@
+# ---------------- GRAVAÇÃO DE MENSAGENS DOS CHATS ---------------- #
+"""
+Este arquivo, message_writer.py, reúne a gravação das mensagens dos chats:
+o resumo desnormalizado da conversa, o payload `message:new` e o gravador em
+lote opcional (`MessageWriter`, "group commit").
+
+Sem o gravador, cada envio faz o próprio INSERT e o próprio commit; sob
+rajadas (ex.: perguntas durante uma aula) o caminho de escrita fica limitado
+pelos fsyncs do banco, um por mensagem.
+
+Com `MESSAGE_GROUP_COMMIT=1`, os envios entram em uma fila e aguardam o
+resultado. O gravador junta as mensagens que chegam em até
+`MESSAGE_BATCH_DELAY_MS` (ou enquanto o lote anterior é gravado) e grava
+todas em uma única transação: INSERT das mensagens e dos termos do índice de
+busca (search.py), resumo de cada conversa e um único UPDATE de
+`Conversation.updatedAt`. Depois do commit, cada remetente recebe o payload
+com o id da sua mensagem e o broadcast é enfileirado normalmente.
+
+Se a gravação do lote falhar, as mensagens são regravadas uma a uma, para
+que uma mensagem inválida não derrube as demais.
+"""
+import asyncio
+import logging
+import time
+from datetime import datetime
+
+from sqlalchemy import or_, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import models, search
+from .config import settings
+from .db import AsyncSessionLocal
+from .routers.chat_ws import dispatch_to_chat
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_PREVIEW_LENGTH = 200
+# Erro entregue aos remetentes cujas mensagens não foram gravadas no encerramento.
+SHUTDOWN_ERROR = "Gravador de mensagens encerrando"
+
+
+# Atualiza o resumo da conversa na mesma transação do INSERT da mensagem.
+# A contagem usa expressão SQL (sem perder incrementos concorrentes) e os
+# campos da "última mensagem" só avançam para ids maiores, já que duas
+# transações podem chegar ao UPDATE fora da ordem de inserção.
+# `count` é o número de mensagens novas da conversa (> 1 no gravador em lote),
+# e `message` a mais recente delas.
+async def update_conversation_summary(db: AsyncSession, chat_id: int, message: models.Message, author_name: str, count: int = 1) -> None:
+    summary = models.ConversationSummary
+    last_values = {
+        "lastMessageId": message.id,
+        "lastMessagePreview": message.content[:SUMMARY_PREVIEW_LENGTH],
+        "lastAuthorId": message.authorId,
+        "lastAuthorName": author_name,
+        "lastMessageAt": message.timestamp,
+    }
+    counted = await db.execute(
+        update(summary).where(summary.conversationId == chat_id).values(messageCount=summary.messageCount + count)
+    )
+    if not counted.rowcount:
+        # Primeira mensagem da conversa. Em um savepoint: se outra transação
+        # criar o resumo ao mesmo tempo, o INSERT falha sem desfazer a
+        # mensagem e o resumo é atualizado como nas demais.
+        try:
+            async with db.begin_nested():
+                db.add(summary(conversationId=chat_id, messageCount=count, **last_values))
+            return
+        except IntegrityError:
+            await db.execute(
+                update(summary).where(summary.conversationId == chat_id).values(messageCount=summary.messageCount + count)
+            )
+    await db.execute(
+        update(summary)
+        .where(summary.conversationId == chat_id, or_(summary.lastMessageId == None, summary.lastMessageId < message.id))
+        .values(**last_values)
+    )
+
+
+def message_payload(chat_id: int, message: models.Message, author_name: str, client_id: str | None = None) -> dict:
+    payload = {
+        "type": "message:new",
+        "chat_id": chat_id,
+        "message": {
+            "id": message.id,
+            "content": message.content,
+            "timestamp": message.timestamp.isoformat(),
+            "authorId": message.authorId,
+            "authorName": author_name,
+        },
+    }
+    if client_id is not None:
+        payload["client_id"] = client_id
+    return payload
+
+
+class PendingMessage:
+    __slots__ = ("chat_id", "subchannel_id", "author_id", "author_name", "content", "client_id", "future", "enqueued_at")
+
+    def __init__(self, chat_id: int, subchannel_id: int, author_id: int, author_name: str, content: str,
+                 client_id: str | None, future: asyncio.Future):
+        self.chat_id = chat_id
+        self.subchannel_id = subchannel_id
+        self.author_id = author_id
+        self.author_name = author_name
+        self.content = content
+        self.client_id = client_id
+        self.future = future
+        self.enqueued_at = time.monotonic()
+
+
+class MessageWriter:
+    def __init__(self, enabled: bool = False, max_delay: float = 0.005, batch_size: int = 200, maxsize: int = 5000):
+        self.enabled = enabled
+        self.max_delay = max_delay
+        self.batch_size = batch_size
+        self.maxsize = maxsize
+        self._queue: asyncio.Queue | None = None
+        self._task: asyncio.Task | None = None
+        self.written = 0
+        self.batches = 0
+        self.write_errors = 0
+        self.fallbacks = 0
+        self.wait_last_ms = 0.0
+        self.wait_max_ms = 0.0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    async def start(self) -> None:
+        if not self.enabled:
+            return
+        self._queue = asyncio.Queue(self.maxsize)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self, timeout: float = 5.0) -> None:
+        if self._task is None:
+            return
+        # Grava o que ainda está na fila antes de encerrar.
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Encerrando com %d mensagens não gravadas", self._queue.qsize())
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        # As que não chegaram a ser gravadas falham, para que os remetentes
+        # não fiquem aguardando indefinidamente.
+        while not self._queue.empty():
+            self._resolve(self._queue.get_nowait(), exc=RuntimeError(SHUTDOWN_ERROR))
+            self._queue.task_done()
+
+    # --- Envio (event loop) ---
+    # Com a fila cheia, o remetente aguarda (contrapressão) em vez de a
+    # mensagem ser descartada.
+    async def submit(self, chat_id: int, subchannel_id: int, author: models.User, content: str,
+                     client_id: str | None = None) -> dict:
+        """Enfileira a mensagem e aguarda a gravação do lote. Retorna o payload `message:new`."""
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put(PendingMessage(chat_id, subchannel_id, author.id, author.name, content, client_id, future))
+        return await future
+
+    # --- Consumo em Lotes ---
+    # Após a primeira mensagem, espera `max_delay` para juntar as seguintes
+    # (a menos que o lote já esteja cheio). As mensagens que chegam enquanto
+    # um lote é gravado formam o próximo.
+    async def _run(self) -> None:
+        while True:
+            batch = [await self._queue.get()]
+            try:
+                if self._queue.qsize() < self.batch_size - 1:
+                    await asyncio.sleep(self.max_delay)
+                while len(batch) < self.batch_size and not self._queue.empty():
+                    batch.append(self._queue.get_nowait())
+                wait_ms = (time.monotonic() - batch[0].enqueued_at) * 1000
+                self.wait_last_ms = wait_ms
+                self.wait_max_ms = max(self.wait_max_ms, wait_ms)
+                await self._flush(batch)
+            except asyncio.CancelledError:
+                # Encerramento (ver `stop`) com o lote ainda em andamento.
+                for item in batch:
+                    self._resolve(item, exc=RuntimeError(SHUTDOWN_ERROR))
+                raise
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    async def _flush(self, batch: list[PendingMessage]) -> None:
+        try:
+            payloads = await self._write(batch)
+        except Exception as exc:
+            self.write_errors += 1
+            if len(batch) == 1:
+                logger.exception("Falha ao gravar mensagem do chat %s", batch[0].chat_id)
+                self._resolve(batch[0], exc=exc)
+                return
+            logger.warning("Falha ao gravar lote de %d mensagens; gravando uma a uma", len(batch))
+            self.fallbacks += 1
+            for item in batch:
+                await self._flush([item])
+            return
+        for item, payload in zip(batch, payloads):
+            # broadcast em background (o dispatcher registra métricas e falhas)
+            dispatch_to_chat(item.chat_id, payload)
+            self._resolve(item, payload=payload)
+
+    async def _write(self, batch: list[PendingMessage]) -> list[dict]:
+        now = datetime.utcnow()
+        async with AsyncSessionLocal() as db:
+            rows = [
+                models.Message(content=item.content, subchannelId=item.subchannel_id, authorId=item.author_id, timestamp=now)
+                for item in batch
+            ]
+            db.add_all(rows)
+            await db.flush()
+
+            # Mensagem mais recente e quantidade de mensagens de cada conversa.
+            latest: dict[int, tuple[models.Message, str, int]] = {}
+            for item, row in zip(batch, rows):
+                count = latest[item.chat_id][2] + 1 if item.chat_id in latest else 1
+                latest[item.chat_id] = (row, item.author_name, count)
+            for chat_id, (row, author_name, count) in latest.items():
+                await update_conversation_summary(db, chat_id, row, author_name, count)
+            await search.index_messages(db, [(item.chat_id, row.id, item.content) for item, row in zip(batch, rows)])
+            await db.execute(
+                update(models.Conversation).where(models.Conversation.id.in_(list(latest))).values(updatedAt=now)
+            )
+            await db.commit()
+        self.written += len(rows)
+        self.batches += 1
+        return [message_payload(item.chat_id, row, item.author_name, item.client_id) for item, row in zip(batch, rows)]
+
+    @staticmethod
+    def _resolve(item: PendingMessage, payload: dict | None = None, exc: Exception | None = None) -> None:
+        # O remetente pode ter desistido (requisição cancelada); a mensagem
+        # gravada ainda é entregue aos demais pelo broadcast.
+        if item.future.done():
+            return
+        if exc is not None:
+            item.future.set_exception(exc)
+        else:
+            item.future.set_result(payload)
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "running": self.running,
+            "queue_depth": self._queue.qsize() if self._queue else 0,
+            "written": self.written,
+            "batches": self.batches,
+            "avg_batch_size": round(self.written / self.batches, 2) if self.batches else 0.0,
+            "write_errors": self.write_errors,
+            "fallbacks": self.fallbacks,
+            "wait_last_ms": round(self.wait_last_ms, 3),
+            "wait_max_ms": round(self.wait_max_ms, 3),
+        }
+
+
+message_writer = MessageWriter(
+    enabled=settings.MESSAGE_GROUP_COMMIT,
+    max_delay=settings.MESSAGE_BATCH_DELAY_MS / 1000,
+    batch_size=settings.MESSAGE_BATCH_SIZE,
+    maxsize=settings.MESSAGE_QUEUE_SIZE,
+)
@@ -33,7 +33,11 @@ academic_group_user_association = Table('AcademicGroup_User', Base.metadata,
 conversation_participants = Table('Conversation_Participants', Base.metadata,
     Column('conversationId', Integer, ForeignKey('Conversation.id'), primary_key=True),
     Column('userId', Integer, ForeignKey('User.id'), primary_key=True),
-    Column('joinedAt', DateTime, default=datetime.utcnow, nullable=False)
+    Column('joinedAt', DateTime, default=datetime.utcnow, nullable=False),
+    # Cursor de leitura: id da última mensagem lida por este participante.
+    Column('lastReadMessageId', Integer, nullable=True),
+    # A chave primária começa por conversationId; a caixa de entrada busca por userId.
+    Index('idx_conversation_participants_user', 'userId'),
 )
 
 class User(Base):
@@ -119,12 +123,28 @@ class Conversation(Base):
     
     participants = relationship("User", secondary=conversation_participants, back_populates="conversations")
     channel = relationship("Channel", uselist=False, back_populates="conversation", cascade="all, delete-orphan")
+    summary = relationship("ConversationSummary", uselist=False, back_populates="conversation", cascade="all, delete-orphan")
     
     __table_args__ = (
         Index("idx_conversation_type", "type"),
         Index("idx_conversation_updated", "updatedAt"),
     )
 
+# Resumo desnormalizado da conversa (última mensagem e contagem), mantido na
+# mesma transação do envio de mensagens. Evita agregar a tabela Message
+# inteira a cada carregamento da lista de conversas.
+class ConversationSummary(Base):
+    __tablename__ = "ConversationSummary"
+    conversationId = Column(Integer, ForeignKey("Conversation.id", ondelete="CASCADE"), primary_key=True)
+    lastMessageId = Column(Integer, nullable=True)
+    lastMessagePreview = Column(String(255), nullable=True)
+    lastAuthorId = Column(Integer, nullable=True)
+    lastAuthorName = Column(String(100), nullable=True)
+    lastMessageAt = Column(DateTime, nullable=True)
+    messageCount = Column(Integer, default=0, nullable=False)
+
+    conversation = relationship("Conversation", back_populates="summary")
+
 class Channel(Base):
     __tablename__ = 'Channel'
     id = Column(Integer, primary_key=True, index=True)
@@ -148,13 +168,98 @@ class Message(Base):
     subchannelId = Column(Integer, ForeignKey("Subchannel.id", ondelete="CASCADE"), nullable=False)
     authorId = Column(Integer, ForeignKey("User.id", ondelete="SET NULL"), nullable=True)
     timestamp = Column(DateTime, default=datetime.utcnow, nullable=False)
+    # Obsoleto: a leitura é controlada por participante em
+    # Conversation_Participants.lastReadMessageId.
     isRead = Column(Boolean, default=False, nullable=False)
     
     subchannel = relationship("Subchannel", back_populates="messages")
     sender = relationship("User", back_populates="messages_sent")
     
     __table_args__ = (
-        Index("idx_message_subchannel", "subchannelId"),
+        # Índice composto para paginação por cursor (keyset) dentro do subcanal.
+        Index("idx_message_subchannel_id", "subchannelId", "id"),
         Index("idx_message_timestamp", "timestamp"),
         Index("idx_message_author", "authorId"),
-    )
\ No newline at end of file
+        # Ids nunca reutilizados, mesmo depois que as mais recentes são
+        # arquivadas (MessageArchive mantém o id original). No MySQL isso exige
+        # o InnoDB 8.0+, que persiste o contador AUTO_INCREMENT entre reinícios.
+        {"sqlite_autoincrement": True},
+    )
+
+# --- Arquivo de Mensagens Antigas ---
+# Mensagens mais antigas que MESSAGE_ARCHIVE_AFTER_DAYS são movidas da tabela
+# Message para MessageArchive, em lotes, por `python -m backend.app.maintenance
+# archive`. O id original é mantido (por isso Message não reutiliza ids), e a
+# leitura do histórico
+# (GET /chats/{id}/messages) continua no arquivo quando a paginação passa da
+# mensagem mais antiga ainda em Message.
+class MessageArchive(Base):
+    __tablename__ = "MessageArchive"
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    content = Column(Text, nullable=False)
+    subchannelId = Column(Integer, ForeignKey("Subchannel.id", ondelete="CASCADE"), nullable=False)
+    authorId = Column(Integer, ForeignKey("User.id", ondelete="SET NULL"), nullable=True)
+    timestamp = Column(DateTime, nullable=False)
+    archivedAt = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        Index("idx_message_archive_subchannel_id", "subchannelId", "id"),
+    )
+
+# Progresso do arquivamento: data de corte da execução atual, maior id já
+# arquivado e total movido. Cada lote é confirmado junto com o checkpoint,
+# então uma execução interrompida é retomada com `archive --resume`.
+class ArchiveCheckpoint(Base):
+    __tablename__ = "ArchiveCheckpoint"
+    name = Column(String(50), primary_key=True)
+    cutoff = Column(DateTime, nullable=False)
+    lastMessageId = Column(Integer, default=0, nullable=False)
+    archivedCount = Column(Integer, default=0, nullable=False)
+    finishedAt = Column(DateTime, nullable=True)
+    updatedAt = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+
+# --- Índice de Busca das Mensagens ---
+# Índice invertido (termo -> mensagens) mantido na mesma transação do INSERT
+# de cada mensagem (ver search.py). A chave (termo, conversa, mensagem) atende
+# a busca em uma conversa; o índice (termo, mensagem) lê as ocorrências mais
+# recentes do termo em todas as conversas, já ordenadas, na busca geral.
+class MessageTerm(Base):
+    __tablename__ = "MessageTerm"
+    term = Column(String(64), primary_key=True)
+    conversationId = Column(Integer, ForeignKey("Conversation.id", ondelete="CASCADE"), primary_key=True)
+    messageId = Column(Integer, ForeignKey("Message.id", ondelete="CASCADE"), primary_key=True)
+
+    __table_args__ = (
+        Index("idx_message_term_message", "messageId"),
+        Index("idx_message_term_recent", "term", "messageId"),
+    )
+
+# --- Caixa de Entrada de Notificações ---
+# Anúncios (broadcast) valem para todos os usuários e não têm linhas em
+# NotificationRecipient; as demais notificações têm uma linha por destinatário.
+class Notification(Base):
+    __tablename__ = "Notification"
+    id = Column(Integer, primary_key=True, index=True)
+    type = Column(String(50), nullable=False)
+    payload = Column(Text, nullable=False)  # JSON enviado ao cliente
+    broadcast = Column(Boolean, default=False, nullable=False)
+    createdAt = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        Index("idx_notification_broadcast", "broadcast", "id"),
+    )
+
+class NotificationRecipient(Base):
+    __tablename__ = "NotificationRecipient"
+    notificationId = Column(Integer, ForeignKey("Notification.id", ondelete="CASCADE"), primary_key=True)
+    userId = Column(Integer, ForeignKey("User.id", ondelete="CASCADE"), primary_key=True)
+
+    __table_args__ = (
+        Index("idx_notification_recipient_user", "userId", "notificationId"),
+    )
+
+# Cursor de confirmação: id da última notificação entregue ao usuário.
+class NotificationCursor(Base):
+    __tablename__ = "NotificationCursor"
+    userId = Column(Integer, ForeignKey("User.id", ondelete="CASCADE"), primary_key=True)
+    lastNotificationId = Column(Integer, default=0, nullable=False)
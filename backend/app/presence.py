@@ -0,0 +1,194 @@
+# ---------------- PRESENÇA ONLINE E INDICADOR DE DIGITAÇÃO ---------------- #
+"""
+Este arquivo, presence.py, mantém em memória quem está online e quem está
+digitando em cada chat, sem gravações no banco de dados.
+
+Presença:
+- Um usuário está online em um worker se tem ao menos um socket autenticado
+  registrado no `ConnectionManager` de notificações (`/ws` ou
+  `/notifications/ws`).
+- A cada `PRESENCE_INTERVAL_SECONDS` cada worker publica no backplane (tópico
+  `presence`) apenas as mudanças locais desde o último ciclo e, de tempos em
+  tempos, um snapshot completo. Um worker que para de publicar snapshots
+  expira após alguns ciclos.
+- As mudanças globais do ciclo são enviadas em um único frame
+  `{"type": "presence", "online": [...], "offline": [...]}` para cada
+  conexão de `/ws`, filtradas pelos participantes dos chats que ela assina.
+
+Digitação:
+- Eventos `typing` recebidos dos clientes são acumulados por chat e
+  publicados (tópico `typing`) no máximo `TYPING_RATE_HZ` vezes por segundo,
+  como `{"type": "typing", "chat_id": 1, "user_ids": [...]}`, apenas para as
+  conexões de `/ws` que assinam o chat. O cliente deve esconder o indicador
+  alguns segundos após o último evento recebido.
+"""
+import asyncio
+import logging
+import time
+import uuid
+
+from .backplane import backplane
+from .config import settings
+from .connections import ClientConnection
+from .framing import Frame
+from .routers.chat_ws import _connections as chat_connections
+from .routers.notifications import manager
+
+logger = logging.getLogger(__name__)
+
+
+class PresenceService:
+    def __init__(self, interval: float = 2.0, snapshot_every: int = 15, typing_rate_hz: float = 3.0):
+        self.interval = interval
+        self.snapshot_every = snapshot_every
+        self.typing_interval = 1 / typing_rate_hz
+        self.worker_id = uuid.uuid4().hex[:12]
+        # Usuários online de cada worker remoto e o horário da última mensagem.
+        self._remote: dict[str, tuple[set[int], float]] = {}
+        self._local: set[int] = set()
+        self.online: set[int] = set()
+        self._watchers: dict[ClientConnection, set[int]] = {}
+        self._typing: dict[int, set[int]] = {}
+        self._tasks: list[asyncio.Task] = []
+        self._ticks = 0
+        self.presence_frames = 0
+        self.typing_published = 0
+
+    async def start(self) -> None:
+        self._tasks = [
+            asyncio.create_task(self._presence_loop()),
+            asyncio.create_task(self._typing_loop()),
+        ]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._tasks = []
+        # Snapshot vazio: os outros workers removem este imediatamente.
+        try:
+            await backplane.publish("presence", {"worker": self.worker_id, "users": []})
+        except Exception:
+            logger.warning("Não foi possível publicar a saída do worker no backplane")
+
+    # --- Conexões Interessadas ---
+    # Cada conexão de /ws informa os usuários que quer acompanhar (os
+    # participantes dos chats assinados).
+    def watch(self, conn: ClientConnection, user_ids: set[int]) -> None:
+        if user_ids:
+            self._watchers[conn] = user_ids
+        else:
+            self._watchers.pop(conn, None)
+
+    def unwatch(self, conn: ClientConnection) -> None:
+        self._watchers.pop(conn, None)
+
+    # --- Presença ---
+    async def _presence_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self._tick()
+            except Exception:
+                logger.exception("Falha no ciclo de presença")
+
+    async def _tick(self) -> None:
+        local = set(manager.active_connections)
+        went_online, went_offline = local - self._local, self._local - local
+        self._local = local
+        self._ticks += 1
+        message = {"worker": self.worker_id}
+        if self._ticks % self.snapshot_every == 1:
+            message["users"] = list(local)
+        elif went_online or went_offline:
+            message.update({"online": list(went_online), "offline": list(went_offline)})
+        if len(message) > 1:
+            await backplane.publish("presence", message)
+        self._refresh()
+
+    async def _on_presence(self, message: dict) -> None:
+        worker = message["worker"]
+        if worker == self.worker_id:
+            return
+        users, _ = self._remote.get(worker, (set(), 0.0))
+        if "users" in message:
+            users = set(message["users"])
+        else:
+            users = (users | set(message.get("online", ()))) - set(message.get("offline", ()))
+        if users:
+            self._remote[worker] = (users, time.monotonic())
+        else:
+            self._remote.pop(worker, None)
+
+    def _refresh(self) -> None:
+        """Recalcula a visão global e envia as mudanças às conexões interessadas."""
+        expired = time.monotonic() - self.interval * self.snapshot_every * 3
+        for worker, (_, seen) in list(self._remote.items()):
+            if seen < expired:
+                del self._remote[worker]
+        online = set(self._local)
+        for users, _ in self._remote.values():
+            online |= users
+        went_online, went_offline = online - self.online, self.online - online
+        self.online = online
+        if not went_online and not went_offline:
+            return
+        for conn, watched in list(self._watchers.items()):
+            on, off = went_online & watched, went_offline & watched
+            if on or off:
+                conn.offer({"type": "presence", "online": list(on), "offline": list(off)})
+                self.presence_frames += 1
+
+    def snapshot(self, user_ids: set[int]) -> list[int]:
+        # Inclui os conectados localmente ainda não vistos por um ciclo.
+        return list((self.online | manager.active_connections.keys()) & user_ids)
+
+    # --- Digitação ---
+    def typing(self, chat_id: int, user_id: int) -> None:
+        self._typing.setdefault(chat_id, set()).add(user_id)
+
+    async def _typing_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.typing_interval)
+            pending, self._typing = self._typing, {}
+            for chat_id, user_ids in pending.items():
+                try:
+                    await backplane.publish("typing", {"chat_id": chat_id, "user_ids": list(user_ids)})
+                    self.typing_published += 1
+                except Exception:
+                    logger.exception("Falha ao publicar digitação do chat %s", chat_id)
+
+    async def _on_typing(self, message: dict) -> None:
+        # Eventos efêmeros: não passam pelo buffer de replay dos chats. Só as
+        # conexões de /ws (as registradas em `watch`) recebem; o socket
+        # legado /chats/ws não conhece o frame `typing`.
+        conns = [conn for conn in chat_connections.get(message["chat_id"], ()) if conn in self._watchers]
+        if not conns:
+            return
+        frame = Frame({"type": "typing", "chat_id": message["chat_id"], "user_ids": message["user_ids"]})
+        for conn in conns:
+            conn.offer(frame)
+
+    def stats(self) -> dict:
+        return {
+            "worker": self.worker_id,
+            "online_local": len(self._local),
+            "online_total": len(self.online),
+            "remote_workers": len(self._remote),
+            "watchers": len(self._watchers),
+            "presence_frames": self.presence_frames,
+            "typing_published": self.typing_published,
+        }
+
+
+presence = PresenceService(
+    interval=settings.PRESENCE_INTERVAL_SECONDS,
+    snapshot_every=settings.PRESENCE_SNAPSHOT_EVERY,
+    typing_rate_hz=settings.TYPING_RATE_HZ,
+)
+backplane.subscribe("presence", presence._on_presence)
+backplane.subscribe("typing", presence._on_typing)
@@ -0,0 +1,81 @@
+# ---------------- BUFFER DE REPLAY DOS CHATS ---------------- #
+"""
+Este arquivo, replay.py, mantém, por chat, um buffer circular (ring buffer)
+com os eventos recentes entregues neste worker, cada um com um número de
+sequência (`seq`) crescente.
+
+Quando um WebSocket cai e reconecta informando `last_seq`, o servidor
+reenvia apenas os eventos perdidos a partir do buffer, sem que o cliente
+precise recarregar todo o histórico. Se a lacuna for mais antiga que o
+buffer, o chamador recorre ao banco de dados.
+
+As sequências são locais ao processo: cada worker tem um `epoch` próprio,
+enviado junto com o `seq`. Um cliente que reconecta em outro worker (epoch
+diferente) cai no caminho do banco de dados.
+"""
+import uuid
+from collections import OrderedDict, deque
+
+from .config import settings
+
+
+class ChatReplayBuffer:
+    def __init__(self, size: int = 200, max_chats: int = 5000):
+        self.size = size
+        self.max_chats = max_chats
+        self.epoch = uuid.uuid4().hex[:12]
+        # Os contadores de sequência nunca são descartados (um inteiro por
+        # chat), para que um seq nunca seja reutilizado após o buffer sair do LRU.
+        self._seq: dict[int, int] = {}
+        self._buffers: "OrderedDict[int, deque]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def current_seq(self, chat_id: int) -> int:
+        return self._seq.get(chat_id, 0)
+
+    def append(self, chat_id: int, payload: dict) -> dict:
+        """Numera o evento, guarda no buffer do chat e devolve a versão numerada."""
+        seq = self._seq.get(chat_id, 0) + 1
+        self._seq[chat_id] = seq
+        stamped = {**payload, "seq": seq, "epoch": self.epoch}
+        buffer = self._buffers.get(chat_id)
+        if buffer is None:
+            buffer = self._buffers[chat_id] = deque(maxlen=self.size)
+            while len(self._buffers) > self.max_chats:
+                self._buffers.popitem(last=False)
+        else:
+            self._buffers.move_to_end(chat_id)
+        buffer.append((seq, stamped))
+        return stamped
+
+    def since(self, chat_id: int, last_seq: int, epoch: str | None) -> list[dict] | None:
+        """
+        Eventos com seq > last_seq, ou None quando o buffer não cobre a lacuna
+        (epoch diferente, seq desconhecido ou eventos já descartados).
+        """
+        current = self._seq.get(chat_id, 0)
+        if epoch != self.epoch or last_seq > current:
+            self.misses += 1
+            return None
+        if last_seq == current:
+            self.hits += 1
+            return []
+        buffer = self._buffers.get(chat_id)
+        if not buffer or buffer[0][0] > last_seq + 1:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return [event for seq, event in buffer if seq > last_seq]
+
+    def stats(self) -> dict:
+        return {
+            "epoch": self.epoch,
+            "chats_buffered": len(self._buffers),
+            "events_buffered": sum(len(buffer) for buffer in self._buffers.values()),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+replay_buffer = ChatReplayBuffer(size=settings.REPLAY_BUFFER_SIZE, max_chats=settings.REPLAY_MAX_CHATS)
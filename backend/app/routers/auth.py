@@ -80,6 +80,7 @@ def logout(token: str = Depends(utils.oauth2_scheme), db: Session = Depends(get_
     if session:
         db.delete(session)
         db.commit()
+    utils.invalidate_token_cache(token)
     return {"message": "Sessão encerrada"}
 
 
@@ -97,6 +98,7 @@ def validate_session(token: str = Depends(utils.oauth2_scheme), db: Session = De
     if session.expirationDate < datetime.utcnow():
         db.delete(session)
         db.commit()
+        utils.invalidate_token_cache(token)
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Sessão expirada")
 
     return {"valid": True, "expires_at": session.expirationDate}
@@ -3,6 +3,7 @@ from sqlalchemy.orm import Session
 from typing import List
 
 from .. import models, schemas, utils
+from ..conversation_routes import invalidate_route
 from ..db import get_db
 
 router = APIRouter(prefix="/channels", tags=["Channels"])
@@ -45,6 +46,7 @@ def create_channel(
     db.add(new_channel)
     db.commit()
     db.refresh(new_channel)
+    invalidate_route(new_channel.conversationId)
     return new_channel
 
 
@@ -91,6 +93,8 @@ def delete_channel(
     if channel.creatorId != current_user.id and current_user.role != "coordenador":
         raise HTTPException(status_code=403, detail="Sem permissão para excluir este canal")
 
+    conversation_id = channel.conversationId
     db.delete(channel)
     db.commit()
+    invalidate_route(conversation_id)
     
\ No newline at end of file
@@ -2,201 +2,468 @@
 """
 Rotas de chat ajustadas para a estrutura:
 Conversation → Channel → Subchannel → Message
+
+As rotas usam a sessão assíncrona (`get_async_db`), liberando o worker
+enquanto aguardam o banco de dados.
 """
 # app/routes/chat_routes.py
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import and_, func
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+from sqlalchemy import and_, case, func, or_, select, update
 from typing import List
 from datetime import datetime
-import asyncio
+import csv
+import io
+import json
+import zlib
 
-from .. import models, schemas, utils
-from ..db import get_db
+from .. import models, schemas, search, utils
+from ..conversation_routes import get_route, remember_subchannel
+from ..config import settings
+from ..db import AsyncSessionLocal, get_async_db
+from ..message_writer import message_payload, message_writer, update_conversation_summary
 
-# import broadcast func (ajuste import relativo conforme projeto)
-from .chat_ws import _broadcast_to_chat
+# despacho de eventos em tempo real (fila thread-safe -> backplane)
+from .chat_ws import dispatch_to_chat
 
 router = APIRouter(prefix="/chats", tags=["Chat"])
 get_current_user = utils.get_current_user
 
-@router.get("/", response_model=List[schemas.Chat])
-def get_user_conversations(db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
+MESSAGE_PAGE_DEFAULT = 50
+MESSAGE_PAGE_MAX = 200
+SEARCH_PAGE_DEFAULT = 20
+SEARCH_PAGE_MAX = 50
+SEARCH_MAX_QUERY_TERMS = 8
+EXPORT_FORMATS = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+EXPORT_COLUMNS = ["id", "timestamp", "subchannelId", "authorId", "authorName", "content"]
+EXPORT_ALL_ROLES = {models.UserRole.coordinator, models.UserRole.admin}
+
+
+# --- Cursores de Leitura ---
+# Cada participante guarda o id da última mensagem lida. As contagens de não
+# lidas são calculadas contra esse cursor (mensagens com id maior que ele,
+# escritas por outra pessoa), usando o índice (subchannelId, id).
+def _advance_read_cursor(chat_id: int, user_id: int, message_id):
+    cp = models.conversation_participants
+    cursor = cp.c.lastReadMessageId
+    return (
+        update(cp)
+        .where(cp.c.conversationId == chat_id, cp.c.userId == user_id)
+        .values(lastReadMessageId=case((or_(cursor == None, cursor < message_id), message_id), else_=cursor))
+    )
+
+
+async def _get_read_cursor(db: AsyncSession, chat_id: int, user_id: int) -> int | None:
+    cp = models.conversation_participants
+    return (await db.execute(
+        select(cp.c.lastReadMessageId).where(cp.c.conversationId == chat_id, cp.c.userId == user_id)
+    )).scalar()
+
+
+async def _unread_counts(db: AsyncSession, user_id: int) -> dict[int, int]:
     """
-    Lista todas as conversas do usuário atual com a última mensagem.
-    Query única + joinedload(participants).
+    Contagem de não lidas de todas as conversas do usuário (inclusive as com
+    zero), em uma única consulta agrupada.
     """
-    # Subquery: última timestamp por conversationId (através de Channel->Subchannel->Message)
-    last_ts_subq = (
-        db.query(
-            models.Channel.conversationId.label("conv_id"),
-            func.max(models.Message.timestamp).label("last_ts"),
-        )
-        .join(models.Subchannel, models.Subchannel.parentChannelId == models.Channel.id)
-        .join(models.Message, models.Message.subchannelId == models.Subchannel.id)
-        .group_by(models.Channel.conversationId)
-        .subquery()
+    cp = models.conversation_participants
+    rows = await db.execute(
+        select(cp.c.conversationId, func.count(models.Message.id))
+        .select_from(cp)
+        .outerjoin(models.Channel, models.Channel.conversationId == cp.c.conversationId)
+        .outerjoin(models.Subchannel, models.Subchannel.parentChannelId == models.Channel.id)
+        .outerjoin(models.Message, and_(
+            models.Message.subchannelId == models.Subchannel.id,
+            models.Message.id > func.coalesce(cp.c.lastReadMessageId, 0),
+            or_(models.Message.authorId == None, models.Message.authorId != user_id),
+        ))
+        .where(cp.c.userId == user_id)
+        .group_by(cp.c.conversationId)
     )
+    return {conversation_id: count for conversation_id, count in rows.all()}
+
+
+# --- Envio de Mensagens ---
+# Compartilhado entre o POST /chats/{chat_id}/messages e o comando
+# `message:send` do WebSocket multiplexado (realtime.py). A verificação de
+# participação fica com o chamador, pela rota da conversa em cache
+# (conversation_routes.py); o subcanal padrão só é consultado/criado aqui
+# enquanto a rota ainda não tem um.
+async def _get_or_create_default_subchannel(db: AsyncSession, chat_id: int) -> models.Subchannel:
+    channel = (await db.execute(
+        select(models.Channel).where(models.Channel.conversationId == chat_id).order_by(models.Channel.id).limit(1)
+    )).scalars().first()
+    if not channel:
+        channel = models.Channel(name=f"Channel-{chat_id}", conversationId=chat_id)
+        db.add(channel)
+        await db.flush()
 
-    rows = (
-        db.query(models.Conversation, models.Message, models.User.name.label("author_name"))
-        .options(joinedload(models.Conversation.participants))
-        .filter(models.Conversation.participants.any(id=current_user.id))
-        .outerjoin(models.Channel, models.Channel.conversationId == models.Conversation.id)
-        .outerjoin(models.Subchannel, models.Subchannel.parentChannelId == models.Channel.id)
-        .outerjoin(last_ts_subq, last_ts_subq.c.conv_id == models.Conversation.id)
-        .outerjoin(
-            models.Message,
-            and_(models.Message.subchannelId == models.Subchannel.id, models.Message.timestamp == last_ts_subq.c.last_ts),
+    subchannel = (await db.execute(
+        select(models.Subchannel).where(models.Subchannel.parentChannelId == channel.id).order_by(models.Subchannel.id).limit(1)
+    )).scalars().first()
+    if not subchannel:
+        subchannel = models.Subchannel(name="Geral", parentChannelId=channel.id)
+        db.add(subchannel)
+        await db.flush()
+    return subchannel
+
+
+async def _create_message(db: AsyncSession, chat_id: int, subchannel_id: int, author: models.User, content: str, client_id: str | None = None) -> dict:
+    """
+    Grava a mensagem e o resumo da conversa, confirma a transação e enfileira
+    o broadcast. Retorna o payload `message:new` enviado aos clientes.
+    `client_id` (id gerado pelo cliente no WebSocket) volta no payload para
+    que os outros dispositivos do autor reconheçam a mensagem otimista.
+    Com o gravador em lote ativo (MESSAGE_GROUP_COMMIT), a mensagem é gravada
+    junto com as demais do lote (ver message_writer.py).
+    """
+    if message_writer.running:
+        # Confirma um subcanal recém-criado (o gravador usa outra sessão) e
+        # devolve a conexão ao pool enquanto a mensagem aguarda o lote.
+        await db.commit()
+        return await message_writer.submit(chat_id, subchannel_id, author, content, client_id)
+
+    now = datetime.utcnow()
+    new_message = models.Message(content=content, subchannelId=subchannel_id, authorId=author.id, timestamp=now)
+    db.add(new_message)
+    await db.flush()
+
+    await update_conversation_summary(db, chat_id, new_message, author.name)
+    await search.index_messages(db, [(chat_id, new_message.id, content)])
+    await db.execute(update(models.Conversation).where(models.Conversation.id == chat_id).values(updatedAt=now))
+
+    await db.commit()
+
+    # payload para clientes
+    payload = message_payload(chat_id, new_message, author.name, client_id)
+
+    # broadcast em background (o dispatcher registra métricas e falhas)
+    dispatch_to_chat(chat_id, payload)
+    return payload
+
+
+# --- Histórico Arquivado ---
+# As mensagens antigas ficam em MessageArchive (ver maintenance.py, tarefa
+# `archive`). O checkpoint guarda o maior id arquivado: ids acima dele estão
+# todos em Message, então a leitura só consulta o arquivo abaixo desse limite.
+async def _archived_boundary(db: AsyncSession) -> int:
+    boundary = (await db.execute(
+        select(models.ArchiveCheckpoint.lastMessageId).where(models.ArchiveCheckpoint.name == "messages")
+    )).scalar()
+    return boundary or 0
+
+
+async def _message_rows(db: AsyncSession, model, subchannel_id: int, before_id: int | None, after_id: int | None, limit: int) -> list:
+    """Página de `model` (Message ou MessageArchive): crescente com after_id, senão decrescente."""
+    query = (
+        select(model, models.User.name.label("author_name"))
+        .outerjoin(models.User, models.User.id == model.authorId)
+        .where(model.subchannelId == subchannel_id)
+    )
+    if after_id is not None:
+        query = query.where(model.id > after_id).order_by(model.id.asc())
+    else:
+        if before_id is not None:
+            query = query.where(model.id < before_id)
+        query = query.order_by(model.id.desc())
+    return list((await db.execute(query.limit(limit))).all())
+
+
+# --- Exportação do Histórico ---
+# O export percorre todas as mensagens da conversa (todos os subcanais), as
+# arquivadas e depois as de Message, com um cursor no servidor
+# (`yield_per`): cada lote de EXPORT_BATCH_SIZE linhas vira
+# um bloco NDJSON/CSV e é enviado antes de o próximo ser lido, com memória
+# constante qualquer que seja o tamanho do histórico. Opcionalmente o arquivo
+# é compactado com gzip à medida que é gerado.
+def _export_query(model, chat_id: int):
+    return (
+        select(model.id, model.timestamp, model.subchannelId, model.authorId, models.User.name, model.content)
+        .join(models.Subchannel, models.Subchannel.id == model.subchannelId)
+        .join(models.Channel, models.Channel.id == models.Subchannel.parentChannelId)
+        .outerjoin(models.User, models.User.id == model.authorId)
+        .where(models.Channel.conversationId == chat_id)
+        .order_by(model.id)
+        .execution_options(yield_per=settings.EXPORT_BATCH_SIZE)
+    )
+
+
+def _export_chunk(rows, export_format: str) -> str:
+    if export_format == "ndjson":
+        return "".join(
+            json.dumps(dict(zip(EXPORT_COLUMNS, (m_id, ts.isoformat(), sub_id, author_id, author_name, content))), ensure_ascii=False) + "\n"
+            for m_id, ts, sub_id, author_id, author_name, content in rows
         )
-        .outerjoin(models.User, models.User.id == models.Message.authorId)
-        .order_by(models.Conversation.updatedAt.desc())
-        .distinct(models.Conversation.id)
-        .all()
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerows(
+        (m_id, ts.isoformat(), sub_id, author_id, author_name, content)
+        for m_id, ts, sub_id, author_id, author_name, content in rows
     )
+    return buffer.getvalue()
+
+
+async def _export_stream(chat_id: int, export_format: str, compress: bool):
+    # Sessão própria: a da requisição é encerrada antes do fim do streaming.
+    # A conexão fica ocupada durante todo o download.
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+    header = ",".join(EXPORT_COLUMNS) + "\r\n" if export_format == "csv" else ""
+
+    async with AsyncSessionLocal() as db:
+        for model in (models.MessageArchive, models.Message):
+            result = await db.stream(_export_query(model, chat_id))
+            async for rows in result.partitions():
+                data = (header + _export_chunk(rows, export_format)).encode("utf-8")
+                header = ""
+                if compressor is not None:
+                    data = compressor.compress(data)
+                if data:
+                    yield data
+
+    tail = header.encode("utf-8")
+    if compressor is not None:
+        tail = compressor.compress(tail) + compressor.flush()
+    if tail:
+        yield tail
+
+
+@router.get("/", response_model=List[schemas.Chat])
+async def get_user_conversations(db: AsyncSession = Depends(get_async_db), current_user: models.User = Depends(get_current_user)):
+    """
+    Lista todas as conversas do usuário atual com a última mensagem.
+    Leitura indexada por usuário (Conversation_Participants.userId) junto ao
+    resumo desnormalizado da conversa + selectinload(participants).
+    """
+    cp = models.conversation_participants
+    rows = (await db.execute(
+        select(models.Conversation, models.ConversationSummary)
+        .join(cp, cp.c.conversationId == models.Conversation.id)
+        .outerjoin(models.ConversationSummary, models.ConversationSummary.conversationId == models.Conversation.id)
+        .where(cp.c.userId == current_user.id)
+        .options(selectinload(models.Conversation.participants))
+        .order_by(models.Conversation.updatedAt.desc())
+    )).all()
+
+    unread = await _unread_counts(db, current_user.id)
 
     result = []
-    seen = set()
-    for conv, msg, author_name in rows:
-        if conv.id in seen:
-            continue
-        seen.add(conv.id)
+    for conv, summary in rows:
         participants = [schemas.UserSimple(id=p.id, name=p.name) for p in (conv.participants or [])]
 
         last_msg_schema = None
-        if msg is not None:
+        if summary is not None and summary.lastMessageId is not None:
             last_msg_schema = schemas.Message(
-                id=msg.id,
-                content=msg.content,
-                timestamp=msg.timestamp,
-                authorId=msg.authorId,
-                authorName=author_name,
+                id=summary.lastMessageId,
+                content=summary.lastMessagePreview,
+                timestamp=summary.lastMessageAt,
+                authorId=summary.lastAuthorId,
+                authorName=summary.lastAuthorName,
             )
 
-        result.append(schemas.Chat(id=conv.id, title=conv.title or "Sem título", participants=participants, last_message=last_msg_schema))
+        result.append(schemas.Chat(
+            id=conv.id,
+            title=conv.title or "Sem título",
+            participants=participants,
+            last_message=last_msg_schema,
+            message_count=summary.messageCount if summary is not None else 0,
+            unread_count=unread.get(conv.id, 0),
+        ))
     return result
 
 
-@router.get("/{chat_id}/messages", response_model=List[schemas.Message])
-def get_chat_messages(chat_id: int, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
+@router.get("/unread", response_model=schemas.UnreadCounts)
+async def get_unread_counts(db: AsyncSession = Depends(get_async_db), current_user: models.User = Depends(get_current_user)):
     """
-    Obtém todas as mensagens de uma conversa específica.
+    Retorna a contagem de mensagens não lidas de todas as conversas do usuário
+    em uma única consulta, evitando abrir cada conversa individualmente.
     """
-    chat = db.query(models.Conversation).filter(models.Conversation.id == chat_id).first()
-    if not chat:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Conversa não encontrada")
-
-    participant_ids = [p.id for p in chat.participants]
-    if current_user.id not in participant_ids:
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Acesso negado a esta conversa")
+    unread = await _unread_counts(db, current_user.id)
+    return schemas.UnreadCounts(
+        total=sum(unread.values()),
+        chats=[schemas.ChatUnread(chat_id=chat_id, unread_count=count) for chat_id, count in unread.items()],
+    )
 
-    channel = db.query(models.Channel).filter(models.Channel.conversationId == chat_id).first()
-    if not channel:
-        return []
 
-    subchannel = db.query(models.Subchannel).filter(models.Subchannel.parentChannelId == channel.id).first()
-    if not subchannel:
-        return []
-
-    rows = (
-        db.query(models.Message, models.User.name.label("author_name"))
-        .outerjoin(models.User, models.User.id == models.Message.authorId)
-        .filter(models.Message.subchannelId == subchannel.id)
-        .order_by(models.Message.timestamp.asc())
-        .all()
+@router.get("/search", response_model=schemas.MessageSearchPage)
+async def search_chat_messages(
+    q: str = Query(..., min_length=1, max_length=200),
+    chat_id: int | None = None,
+    cursor: str | None = None,
+    limit: int = Query(SEARCH_PAGE_DEFAULT, ge=1, le=SEARCH_PAGE_MAX),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: models.User = Depends(get_current_user),
+):
+    """
+    Busca mensagens pelo texto nas conversas do usuário (ou apenas em
+    `chat_id`), usando o índice invertido de search.py. Resultados por
+    relevância e paginados com `cursor` (o `next_cursor` da página anterior).
+    `truncated` avisa que a busca leu apenas as ocorrências mais recentes de
+    algum termo.
+    """
+    terms = search.tokenize(q, limit=SEARCH_MAX_QUERY_TERMS)
+    if not terms:
+        return schemas.MessageSearchPage(items=[])
+    try:
+        position = search.decode_cursor(cursor) if cursor is not None else None
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Cursor inválido")
+
+    if chat_id is not None:
+        route = await get_route(chat_id, db)
+        if route is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Conversa não encontrada")
+        if not route.is_participant(current_user.id):
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Acesso negado a esta conversa")
+
+    rows, next_cursor, truncated = await search.search_messages(db, current_user.id, terms, chat_id, position, limit)
+    return schemas.MessageSearchPage(
+        items=[
+            schemas.MessageSearchHit(
+                chat_id=conversation_id,
+                score=score,
+                message=schemas.Message(id=m.id, content=m.content, timestamp=m.timestamp, authorId=m.authorId, authorName=author_name),
+            )
+            for score, conversation_id, m, author_name in rows
+        ],
+        next_cursor=next_cursor,
+        truncated=truncated,
     )
 
+
+@router.get("/{chat_id}/messages", response_model=schemas.MessagePage)
+async def get_chat_messages(
+    chat_id: int,
+    before_id: int | None = None,
+    after_id: int | None = None,
+    limit: int = Query(MESSAGE_PAGE_DEFAULT, ge=1, le=MESSAGE_PAGE_MAX),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: models.User = Depends(get_current_user),
+):
+    """
+    Obtém as mensagens de uma conversa com paginação por cursor (keyset).
+    Sem cursor, retorna a página mais recente. `before_id` busca mensagens
+    anteriores a um id e `after_id`, posteriores. A consulta usa o índice
+    composto (subchannelId, id), com custo independente do tamanho do histórico.
+    Mensagens arquivadas (MessageArchive) só são lidas quando a paginação
+    passa da mais antiga ainda em Message.
+    """
+    if before_id is not None and after_id is not None:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Use before_id ou after_id, não ambos")
+
+    route = await get_route(chat_id, db)
+    if route is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Conversa não encontrada")
+    if not route.is_participant(current_user.id):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Acesso negado a esta conversa")
+    if route.subchannel_id is None:
+        return schemas.MessagePage(items=[])
+
+    # Busca um item a mais (limit + 1) para saber se existe outra página.
+    if after_id is not None:
+        rows = []
+        if await _archived_boundary(db) > after_id:
+            rows = await _message_rows(db, models.MessageArchive, route.subchannel_id, None, after_id, limit + 1)
+        if len(rows) <= limit:
+            rows += await _message_rows(db, models.Message, route.subchannel_id, None, after_id, limit + 1 - len(rows))
+    else:
+        rows = await _message_rows(db, models.Message, route.subchannel_id, before_id, None, limit + 1)
+        # Fim da janela quente: continua no arquivo, abaixo da mais antiga lida.
+        if len(rows) <= limit and await _archived_boundary(db):
+            older_than = rows[-1][0].id if rows else before_id
+            rows += await _message_rows(db, models.MessageArchive, route.subchannel_id, older_than, None, limit + 1 - len(rows))
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if after_id is None:
+        rows.reverse()
+
     messages = [
         schemas.Message(id=m.id, content=m.content, timestamp=m.timestamp, authorId=m.authorId, authorName=author_name)
         for (m, author_name) in rows
     ]
 
-    # marca como lidas somente se houver atualizações
-    updated = db.query(models.Message).filter(
-        models.Message.subchannelId == subchannel.id,
-        models.Message.authorId != current_user.id,
-        models.Message.isRead == False
-    ).update({"isRead": True})
-    if updated:
-        db.commit()
+    if after_id is not None:
+        next_cursor = messages[0].id if messages else None
+        prev_cursor = messages[-1].id if has_more else None
+    else:
+        next_cursor = messages[0].id if has_more else None
+        prev_cursor = messages[-1].id if before_id is not None and messages else None
+
+    # avança o cursor de leitura até a mensagem mais nova desta página
+    last_read_id = await _get_read_cursor(db, chat_id, current_user.id)
+    if messages and (last_read_id is None or last_read_id < messages[-1].id):
+        await db.execute(_advance_read_cursor(chat_id, current_user.id, messages[-1].id))
+        await db.commit()
+
+    return schemas.MessagePage(items=messages, next_cursor=next_cursor, prev_cursor=prev_cursor, last_read_id=last_read_id)
+
+
+@router.get("/{chat_id}/export")
+async def export_chat_messages(
+    chat_id: int,
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    gzip: bool = False,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: models.User = Depends(get_current_user),
+):
+    """
+    Exporta o histórico completo da conversa em NDJSON (um objeto por linha)
+    ou CSV, em streaming. Com `gzip=true` o arquivo é enviado compactado
+    (.gz). Permitido aos participantes e a coordenadores/administradores.
+    """
+    route = await get_route(chat_id, db)
+    if route is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Conversa não encontrada")
+    if not route.is_participant(current_user.id) and current_user.role not in EXPORT_ALL_ROLES:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Acesso negado a esta conversa")
 
-    return messages
+    filename = f"chat-{chat_id}.{format}" + (".gz" if gzip else "")
+    return StreamingResponse(
+        _export_stream(chat_id, format, gzip),
+        media_type="application/gzip" if gzip else f"{EXPORT_FORMATS[format]}; charset=utf-8",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
 
 
 @router.post("/{chat_id}/messages", response_model=schemas.Message, status_code=status.HTTP_201_CREATED)
-def send_message(chat_id: int, message: schemas.MessageCreate, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
+async def send_message(chat_id: int, message: schemas.MessageCreate, db: AsyncSession = Depends(get_async_db), current_user: models.User = Depends(get_current_user)):
     """
-    Envia nova mensagem, grava no DB e dispara broadcast via WebSocket (background).
+    Envia nova mensagem, grava no DB e enfileira o broadcast via WebSocket.
     """
-    chat = db.query(models.Conversation).filter(models.Conversation.id == chat_id).first()
-    if not chat:
+    route = await get_route(chat_id, db)
+    if route is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Conversa não encontrada")
-
-    participant_ids = [p.id for p in chat.participants]
-    if current_user.id not in participant_ids:
+    if not route.is_participant(current_user.id):
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Você não pode enviar mensagens para esta conversa")
 
-    channel = db.query(models.Channel).filter(models.Channel.conversationId == chat_id).first()
-    if not channel:
-        channel = models.Channel(name=f"Channel-{chat_id}", conversationId=chat_id)
-        db.add(channel)
-        db.flush()
-
-    subchannel = db.query(models.Subchannel).filter(models.Subchannel.parentChannelId == channel.id).first()
-    if not subchannel:
-        subchannel = models.Subchannel(name="Geral", parentChannelId=channel.id)
-        db.add(subchannel)
-        db.flush()
-
-    new_message = models.Message(content=message.content, subchannelId=subchannel.id, authorId=current_user.id, timestamp=datetime.utcnow(), isRead=False)
-    db.add(new_message)
-
-    chat.updatedAt = datetime.utcnow()
-
-    db.commit()
-    db.refresh(new_message)
-
-    # payload para clientes
-    payload = {
-        "type": "message:new",
-        "chat_id": chat_id,
-        "message": {
-            "id": new_message.id,
-            "content": new_message.content,
-            "timestamp": new_message.timestamp.isoformat(),
-            "authorId": new_message.authorId,
-            "authorName": current_user.name,
-        },
-    }
-
-    # broadcast em background
-    try:
-        asyncio.create_task(_broadcast_to_chat(chat_id, payload))
-    except Exception:
-        pass
+    subchannel_id = route.subchannel_id
+    if subchannel_id is None:
+        subchannel_id = (await _get_or_create_default_subchannel(db, chat_id)).id
+    payload = await _create_message(db, chat_id, subchannel_id, current_user, message.content)
+    if route.subchannel_id is None:
+        remember_subchannel(route, subchannel_id)
 
-    return schemas.Message(id=new_message.id, content=new_message.content, timestamp=new_message.timestamp, authorId=new_message.authorId, authorName=current_user.name)
+    return schemas.Message(**payload["message"])
 
 
 @router.post("/{chat_id}/read", status_code=status.HTTP_204_NO_CONTENT)
-def mark_messages_as_read(chat_id: int, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
-    conversation = db.query(models.Conversation).filter(models.Conversation.id == chat_id).first()
-    if not conversation:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Conversa não encontrada")
-
-    participant_ids = [p.id for p in conversation.participants]
-    if current_user.id not in participant_ids:
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Acesso negado a esta conversa")
-
-    channel = db.query(models.Channel).filter(models.Channel.conversationId == chat_id).first()
-    if not channel:
-        return
-
-    subchannel = db.query(models.Subchannel).filter(models.Subchannel.parentChannelId == channel.id).first()
-    if not subchannel:
+async def mark_messages_as_read(chat_id: int, db: AsyncSession = Depends(get_async_db), current_user: models.User = Depends(get_current_user)):
+    """
+    Marca a conversa como lida: um único UPDATE que move o cursor do
+    participante até a última mensagem registrada no resumo da conversa.
+    """
+    latest = (
+        select(models.ConversationSummary.lastMessageId)
+        .where(models.ConversationSummary.conversationId == chat_id)
+        .scalar_subquery()
+    )
+    updated = await db.execute(_advance_read_cursor(chat_id, current_user.id, latest))
+    if updated.rowcount:
+        await db.commit()
         return
 
-    updated = db.query(models.Message).filter(models.Message.subchannelId == subchannel.id, models.Message.authorId != current_user.id, models.Message.isRead == False).update({"isRead": True})
-    if updated:
-        db.commit()
-    return
+    # Nenhuma linha afetada: a conversa não existe ou o usuário não participa dela.
+    if await get_route(chat_id, db) is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Conversa não encontrada")
+    raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Acesso negado a esta conversa")
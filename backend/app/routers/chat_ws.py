@@ -2,40 +2,209 @@
 import asyncio
 from typing import Dict, Set
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect
+from sqlalchemy import select
+
+from .. import models, utils
+from ..backplane import backplane
+from ..config import settings
+from ..connections import ClientConnection
+from ..conversation_routes import ROUTES_TOPIC, get_route
+from ..db import AsyncSessionLocal
+from ..dispatch import dispatcher
+from ..framing import Frame, negotiate_encoding
+from ..replay import replay_buffer
 
 router = APIRouter(prefix="/chats", tags=["Chat"])
 
-# mapa chat_id -> set of WebSocket connections
-_connections: Dict[int, Set[WebSocket]] = {}
+# mapa chat_id -> set of client connections (somente deste worker)
+_connections: Dict[int, Set[ClientConnection]] = {}
+
+def register_connection(chat_id: int, conn: ClientConnection) -> None:
+    _connections.setdefault(chat_id, set()).add(conn)
+
+def unregister_connection(chat_id: int, conn: ClientConnection) -> None:
+    conns = _connections.get(chat_id)
+    if conns is not None:
+        conns.discard(conn)
+        if not conns:
+            del _connections[chat_id]
+
+def chat_connection_stats(top: int = 20) -> dict:
+    """Conexões por chat neste worker (total, maior chat e os `top` maiores)."""
+    counts = {chat_id: len(conns) for chat_id, conns in _connections.items()}
+    largest = sorted(counts.items(), key=lambda item: item[1], reverse=True)[:top]
+    return {
+        "chats": len(counts),
+        "subscriptions": sum(counts.values()),
+        "max_per_chat": largest[0][1] if largest else 0,
+        "top": [{"chat_id": chat_id, "connections": count} for chat_id, count in largest],
+    }
 
 async def _broadcast_to_chat(chat_id: int, payload: dict):
-    """Envia payload a todas as conexões websocket do chat (não bloqueante)."""
+    """
+    Publica o payload no backplane; cada worker o entrega às conexões locais
+    do chat (ver `_deliver_to_chat`).
+    """
+    await backplane.publish("chat", {"chat_id": chat_id, "payload": payload})
+
+def dispatch_to_chat(chat_id: int, payload: dict) -> bool:
+    """
+    Versão síncrona e thread-safe de `_broadcast_to_chat`: apenas enfileira o
+    evento no dispatcher, que o publica no backplane a partir do event loop.
+    Pode ser chamada de rotas `def` (threadpool) ou `async def`.
+    """
+    return dispatcher.emit("chat", {"chat_id": chat_id, "payload": payload})
+
+async def _deliver_to_chat(message: dict):
+    """
+    Enfileira o payload em todas as conexões do chat neste worker. Não aguarda
+    o envio: cada conexão tem sua própria task escritora. O payload é
+    serializado uma única vez (Frame) e compartilhado entre as conexões.
+    """
+    chat_id = message["chat_id"]
+    payload = replay_buffer.append(chat_id, message["payload"])
     conns = list(_connections.get(chat_id, set()))
     if not conns:
         return
-    await asyncio.gather(*[conn.send_json(payload) for conn in conns], return_exceptions=True)
+    frame = Frame(payload)
+    for conn in conns:
+        conn.offer(frame)
+
+backplane.subscribe("chat", _deliver_to_chat)
+
+# --- Revogação de Acesso ---
+# Quando a rota de uma conversa é invalidada (participantes ou canais
+# alterados), cada worker recarrega a rota e tira do chat as conexões de
+# usuários que deixaram de participar: o /ws apenas cancela a assinatura (e
+# a presença), o socket antigo por chat é fechado com 1008.
+async def _revoke_removed(message: dict):
+    chat_id = message["chat_id"]
+    if chat_id not in _connections:
+        return
+    route = await get_route(chat_id)
+    participant_ids = route.participant_ids if route is not None else frozenset()
+    for conn in list(_connections.get(chat_id, ())):
+        if conn.user_id is None or conn.user_id in participant_ids:
+            continue
+        unregister_connection(chat_id, conn)
+        if conn.on_revoke is not None:
+            conn.on_revoke(chat_id)
+        else:
+            asyncio.get_running_loop().create_task(conn.close(1008, "access revoked"))
+
+# Registrado depois do handler de conversation_routes, que descarta a rota
+# em cache antes desta recarga.
+backplane.subscribe(ROUTES_TOPIC, _revoke_removed)
+
+# --- Recuperação após Reconexão ---
+# Consulta o banco quando a lacuna é mais antiga que o buffer de replay.
+# Retorna None se houver mais mensagens que o limite (o cliente deve
+# recarregar o histórico pela API REST paginada).
+async def _missed_messages(chat_id: int, last_message_id: int) -> list[dict] | None:
+    async with AsyncSessionLocal() as db:
+        rows = (await db.execute(
+            select(models.Message, models.User.name)
+            .join(models.Subchannel, models.Subchannel.id == models.Message.subchannelId)
+            .join(models.Channel, models.Channel.id == models.Subchannel.parentChannelId)
+            .outerjoin(models.User, models.User.id == models.Message.authorId)
+            .where(models.Channel.conversationId == chat_id, models.Message.id > last_message_id)
+            .order_by(models.Message.id.asc())
+            .limit(settings.REPLAY_DB_LIMIT + 1)
+        )).all()
+    if len(rows) > settings.REPLAY_DB_LIMIT:
+        return None
+    return [
+        {
+            "type": "message:new",
+            "chat_id": chat_id,
+            "message": {
+                "id": m.id,
+                "content": m.content,
+                "timestamp": m.timestamp.isoformat(),
+                "authorId": m.authorId,
+                "authorName": author_name,
+            },
+        }
+        for m, author_name in rows
+    ]
+
+async def _replay_missed(conn: ClientConnection, chat_id: int, last_seq: int | None, epoch: str | None, last_message_id: int | None):
+    """
+    Reenvia os eventos perdidos e termina com um frame `sync` contendo o seq
+    atual. `source` indica a origem: buffer, database, none ou reset (o
+    cliente deve recarregar o histórico via GET /chats/{chat_id}/messages).
+    """
+    current_seq = replay_buffer.current_seq(chat_id)
+    source, events, held = "none", [], []
+    if last_seq is not None:
+        missed = replay_buffer.since(chat_id, last_seq, epoch)
+        if missed is not None:
+            source, events = "buffer", missed
+        elif last_message_id is not None:
+            # A conexão já está registrada no chat: os eventos ao vivo que
+            # chegam durante a consulta ficam retidos e vão depois do replay,
+            # sem as mensagens que o banco já devolveu.
+            conn.hold()
+            try:
+                missed = await _missed_messages(chat_id, last_message_id)
+            finally:
+                held = conn.release()
+            source, events = ("database", missed) if missed is not None else ("reset", [])
+        else:
+            source = "reset"
+    for event in events:
+        conn.offer(event)
+    conn.offer({"type": "sync", "chat_id": chat_id, "seq": current_seq, "epoch": replay_buffer.epoch, "source": source, "replayed": len(events)})
+
+    replayed_id = events[-1]["message"]["id"] if source == "database" and events else last_message_id
+    for frame in held:
+        event = frame.payload
+        if (source == "database" and event.get("type") == "message:new" and event.get("chat_id") == chat_id
+                and event["message"]["id"] <= replayed_id):
+            continue
+        conn.offer(frame)
 
 @router.websocket("/ws/{chat_id}")
-async def websocket_endpoint(websocket: WebSocket, chat_id: int, token: str = None):
+async def websocket_endpoint(
+    websocket: WebSocket,
+    chat_id: int,
+    token: str = None,
+    last_seq: int | None = None,
+    epoch: str | None = None,
+    last_message_id: int | None = None,
+    heartbeat: bool = False,
+):
     """
-    WebSocket para receber updates em tempo real para um chat.
-    Opcional: token para autenticação (implemente validação se quiser).
+    WebSocket para receber updates em tempo real para um chat. Exige o
+    `token` de um participante da conversa (fecha com 1008 caso contrário).
+    Ao reconectar, o cliente envia `last_seq`/`epoch` do último evento
+    recebido (e opcionalmente `last_message_id`) para receber só o que perdeu.
+    Heartbeat e timeout de inatividade são opcionais (`?heartbeat=true`):
+    clientes antigos apenas escutam e nunca enviam frames ao servidor.
     """
-    await websocket.accept()
-    chat_id = int(chat_id)
-    if chat_id not in _connections:
-        _connections[chat_id] = set()
-    _connections[chat_id].add(websocket)
+    user = await utils.authenticate_token(token)
+    route = await get_route(chat_id) if user is not None else None
+    if route is None or not route.is_participant(user.id):
+        await websocket.close(code=1008)
+        return
+
+    encoding, subprotocol = negotiate_encoding(websocket)
+    await websocket.accept(subprotocol=subprotocol)
+    idle_timeout = settings.WS_IDLE_TIMEOUT_SECONDS if heartbeat else None
+    conn = ClientConnection(websocket, encoding, heartbeat=heartbeat, idle_timeout=idle_timeout, user_id=user.id)
+    conn.start()
+    register_connection(chat_id, conn)
 
     try:
+        await _replay_missed(conn, chat_id, last_seq, epoch, last_message_id)
         while True:
-            # Mantém a conexão viva. Recebe pings do cliente (opcional).
-            _ = await websocket.receive_text()
+            # Mantém a conexão viva. Com heartbeat, o cliente deve responder
+            # aos pings com qualquer frame, ou será desconectado por inatividade.
+            await conn.receive()
     except WebSocketDisconnect:
-        _connections.get(chat_id, set()).discard(websocket)
+        pass
     except Exception:
-        _connections.get(chat_id, set()).discard(websocket)
-        try:
-            await websocket.close()
-        except Exception:
-            pass
+        pass
+    finally:
+        unregister_connection(chat_id, conn)
+        await conn.close()
@@ -13,11 +13,12 @@ Suas responsabilidades incluem:
   de dados e as respostas JSON.
 """
 from fastapi import APIRouter, Depends, HTTPException, status, Response
-from sqlalchemy.orm import Session
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
 from datetime import datetime, time as dt_time
 from .. import models, schemas
-from ..db import get_db
+from ..db import get_async_db
 from ..utils import require_roles
 
 User = models.User
@@ -35,8 +36,9 @@ router = APIRouter(
 # Ideal para alimentar um calendário geral. Realiza a conversão dos objetos
 # `time` do banco para strings no formato "HH:MM:SS" para a resposta JSON.
 @router.get("/", response_model=List[schemas.EventResponse])
-def list_events(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    events = db.query(models.Event).offset(skip).limit(limit).all()
+async def list_events(skip: int = 0, limit: int = 100, db: AsyncSession = Depends(get_async_db)):
+    result = await db.execute(select(models.Event).offset(skip).limit(limit))
+    events = result.scalars().all()
 
     # A conversão manual é necessária para garantir que os objetos `time`
     # sejam serializados corretamente para JSON como strings.
@@ -64,8 +66,8 @@ def list_events(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
 # Endpoint público que busca e retorna os detalhes de um único evento
 # com base no seu ID. Lança um erro 404 se o evento não for encontrado.
 @router.get("/{event_id}", response_model=schemas.EventResponse)
-def get_event(event_id: int, db: Session = Depends(get_db)):
-    event = db.query(models.Event).filter(models.Event.id == event_id).first()
+async def get_event(event_id: int, db: AsyncSession = Depends(get_async_db)):
+    event = await db.get(models.Event, event_id)
     if not event:
         raise HTTPException(status_code=404, detail="Evento não encontrado")
 
@@ -86,9 +88,9 @@ def get_event(event_id: int, db: Session = Depends(get_db)):
 # Apenas usuários com os papéis definidos em `require_roles` podem acessá-lo.
 # Inclui lógica para converter a string de hora do request em objetos `time`.
 @router.post("/", response_model=schemas.EventResponse, status_code=status.HTTP_201_CREATED)
-def create_event(
+async def create_event(
     event_data: schemas.EventCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: models.User = Depends(require_roles(["admin", "coordinator", "teacher"]))
 ):
     start_time, end_time = None, None
@@ -114,8 +116,7 @@ def create_event(
         creatorId=current_user.id
     )
     db.add(new_event_db)
-    db.commit()
-    db.refresh(new_event_db)
+    await db.commit()
 
     return new_event_db # O Pydantic response_model lida com a conversão
 
@@ -123,13 +124,13 @@ def create_event(
 # Endpoint protegido para modificar um evento. Além da verificação de papel,
 # ele garante que apenas o criador original ou um admin possa realizar a atualização.
 @router.put("/{event_id}", response_model=schemas.EventResponse)
-def update_event(
+async def update_event(
     event_id: int,
     event_update: schemas.EventCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(require_roles(["admin", "coordinator", "teacher"]))
 ):
-    db_event = db.query(models.Event).filter(models.Event.id == event_id).first()
+    db_event = await db.get(models.Event, event_id)
     if not db_event:
         raise HTTPException(status_code=404, detail="Evento não encontrado")
 
@@ -156,8 +157,7 @@ def update_event(
     db_event.endTime = end_time
     db_event.academicGroupId = event_update.academicGroupId or event_update.local
     
-    db.commit()
-    db.refresh(db_event)
+    await db.commit()
 
     return db_event
 
@@ -166,13 +166,12 @@ def update_event(
 # mesmas regras de permissão da rota de atualização. Retorna um status
 # 204 (No Content) em caso de sucesso.
 @router.delete("/{event_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_event(
+async def delete_event(
     event_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(require_roles(["admin", "coordinator", "teacher"]))
 ):
-    event_query = db.query(models.Event).filter(models.Event.id == event_id)
-    db_event = event_query.first()
+    db_event = await db.get(models.Event, event_id)
 
     if not db_event:
         raise HTTPException(status_code=404, detail="Evento não encontrado")
@@ -180,7 +179,7 @@ def delete_event(
     if db_event.creatorId != current_user.id and current_user.role != models.UserRole.admin:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Permissão negada para excluir este evento")
     
-    event_query.delete(synchronize_session=False)
-    db.commit()
+    await db.execute(delete(models.Event).where(models.Event.id == event_id))
+    await db.commit()
     
     return Response(status_code=status.HTTP_204_NO_CONTENT)
@@ -1,66 +1,280 @@
 # backend/app/routers/notifications.py
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Depends
+from fastapi import APIRouter, Depends, Query, WebSocket, WebSocketDisconnect, status
+from sqlalchemy import and_, or_, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from typing import Dict, Set
+from collections import deque
+from typing import Deque, Dict, Set
+import asyncio
 import json
+import logging
 from datetime import datetime
-from .. import models
-from ..db import get_db
-from ..utils import decode_token
+from .. import models, schemas
+from ..backplane import backplane
+from ..config import settings
+from ..connections import ClientConnection
+from ..db import AsyncSessionLocal, get_async_db
+from ..framing import Frame, negotiate_encoding
+from ..inbox import inbox_writer
+from ..utils import authenticate_token, get_current_user
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/notifications", tags=["Notifications"])
 
+NOTIFICATION_PAGE_DEFAULT = 50
+NOTIFICATION_PAGE_MAX = 200
+
 class ConnectionManager:
     def __init__(self):
-        self.active_connections: Dict[int, Set[WebSocket]] = {}
+        self.active_connections: Dict[int, Set[ClientConnection]] = {}
+        # Maior notification_id escrito no socket de cada usuário conectado;
+        # gravado no cursor quando a última conexão do usuário neste worker
+        # fecha. Só avança por ids que podem virar cursor sem pular
+        # notificações ainda não enviadas (ver `_offer`).
+        self.delivered: Dict[int, int] = {}
+        # Por conexão: ids elegíveis ao cursor, na ordem da fila de envio.
+        self._eligible: Dict[ClientConnection, Deque[int]] = {}
+        # Conexões cuja caixa de entrada já foi reenviada por completo; só
+        # nelas as notificações ao vivo avançam o cursor.
+        self._live_ok: Set[ClientConnection] = set()
+        self._cursor_tasks: Set[asyncio.Task] = set()
 
-    async def connect(self, websocket: WebSocket, user_id: int):
-        await websocket.accept()
-        if user_id not in self.active_connections:
-            self.active_connections[user_id] = set()
-        self.active_connections[user_id].add(websocket)
+    async def connect(self, websocket: WebSocket, user_id: int, heartbeat: bool = True) -> ClientConnection:
+        encoding, subprotocol = negotiate_encoding(websocket)
+        await websocket.accept(subprotocol=subprotocol)
+        idle_timeout = settings.WS_IDLE_TIMEOUT_SECONDS if heartbeat else None
+        conn = ClientConnection(websocket, encoding, heartbeat=heartbeat, idle_timeout=idle_timeout)
+        conn.start()
+        self.register(conn, user_id)
+        return conn
 
-    def disconnect(self, websocket: WebSocket, user_id: int):
+    def register(self, conn: ClientConnection, user_id: int):
+        # Também usado pelo socket multiplexado (/ws), que aceita a conexão por conta própria.
+        # Os frames ao vivo ficam retidos até `deliver_inbox` enfileirar a
+        # caixa de entrada, para que uma notificação publicada durante a
+        # consulta não seja enviada duas vezes (ver `offer_inbox`).
+        conn.hold()
+        self.active_connections.setdefault(user_id, set()).add(conn)
+        self._eligible[conn] = deque()
+        conn.on_sent = lambda frame: self._on_sent(conn, user_id, frame)
+
+    async def disconnect(self, conn: ClientConnection, user_id: int):
+        conn.on_sent = None
+        self._eligible.pop(conn, None)
+        self._live_ok.discard(conn)
         if user_id in self.active_connections:
-            self.active_connections[user_id].discard(websocket)
+            self.active_connections[user_id].discard(conn)
             if not self.active_connections[user_id]:
                 del self.active_connections[user_id]
+                last_id = self.delivered.pop(user_id, None)
+                if last_id is not None:
+                    # Em task própria: o handler do socket pode estar sendo
+                    # cancelado, e a gravação não deve ser interrompida.
+                    task = asyncio.get_running_loop().create_task(save_notification_cursor(user_id, last_id))
+                    self._cursor_tasks.add(task)
+                    task.add_done_callback(self._cursor_tasks.discard)
+        await conn.close()
 
-    async def send_personal_message(self, message: dict, user_id: int):
-        if user_id in self.active_connections:
-            for connection in self.active_connections[user_id]:
-                try:
-                    await connection.send_json(message)
-                except:
-                    pass
+    def mark_delivered(self, user_id: int, notification_id: int):
+        if notification_id > self.delivered.get(user_id, 0):
+            self.delivered[user_id] = notification_id
+
+    # --- Cursor Implícito (entregas efetivas) ---
+    # Um id só é elegível ao cursor se todas as notificações anteriores a ele
+    # já estiverem na fila da conexão: as da caixa de entrada (em ordem) e as
+    # ao vivo depois que a caixa de entrada foi reenviada por completo. Com
+    # `has_more` (pendentes além do limite), as ao vivo nunca avançam o
+    # cursor; o cliente confirma com POST /notifications/ack ou
+    # `notifications:ack`. O cursor avança quando a task escritora envia o
+    # frame, e como a fila é FIFO, todos os anteriores já foram enviados.
+    def _offer(self, conn: ClientConnection, frame: "dict | Frame", notification_id: int | None, live: bool) -> None:
+        if conn.offer(frame) and notification_id is not None and (not live or conn in self._live_ok):
+            eligible = self._eligible.get(conn)
+            if eligible is not None:
+                eligible.append(notification_id)
+
+    def offer_inbox(self, conn: ClientConnection, rows: list[models.Notification], complete: bool, held: list[Frame] = ()):
+        for row in rows:
+            self._offer(conn, _inbox_payload(row), row.id, live=False)
+        if complete and conn in self._eligible:
+            self._live_ok.add(conn)
+        # Frames retidos durante a consulta, na ordem original; as
+        # notificações já incluídas na caixa de entrada são descartadas.
+        replayed_id = rows[-1].id if rows else 0
+        for frame in held:
+            notification_id = frame.payload.get("notification_id")
+            if notification_id is not None and notification_id <= replayed_id:
+                continue
+            self._offer(conn, frame, notification_id, live=True)
+
+    def _on_sent(self, conn: ClientConnection, user_id: int, frame: Frame):
+        eligible = self._eligible.get(conn)
+        if eligible and frame.payload.get("notification_id") == eligible[0]:
+            self.mark_delivered(user_id, eligible.popleft())
+
+    async def send_personal_message(self, message: "dict | Frame", user_id: int):
+        # Apenas enfileira: a task escritora de cada conexão faz o envio.
+        for conn in list(self.active_connections.get(user_id, ())):
+            conn.offer(message)
 
     async def broadcast_to_users(self, message: dict, user_ids: list):
-        for user_id in user_ids:
-            await self.send_personal_message(message, user_id)
+        # Grava na caixa de entrada (em lote) e depois publica no backplane,
+        # para alcançar usuários conectados a outros workers.
+        inbox_writer.emit("notifications", {"user_ids": list(user_ids), "message": message})
+
+    async def broadcast_to_connected(self, message: dict):
+        # Cada worker entrega aos seus próprios usuários conectados; não há
+        # lista de destinatários (nem consulta à tabela de usuários). Quem
+        # está desconectado recebe pela caixa de entrada.
+        inbox_writer.emit("notifications", {"connected": True, "message": message})
+
+    async def deliver_local(self, envelope: dict):
+        # Serializa uma única vez para todos os destinatários deste worker e
+        # enfileira em lotes, cedendo o event loop entre eles para que um
+        # fan-out grande não atrase os demais sockets e requisições.
+        frame = Frame(envelope["message"])
+        notification_id = envelope["message"].get("notification_id")
+        if envelope.get("connected"):
+            user_ids = list(self.active_connections)
+        else:
+            user_ids = envelope["user_ids"]
+        batch_size = settings.NOTIFY_FANOUT_BATCH_SIZE
+        for start in range(0, len(user_ids), batch_size):
+            if start:
+                await asyncio.sleep(0)
+            for user_id in user_ids[start:start + batch_size]:
+                for conn in list(self.active_connections.get(user_id, ())):
+                    self._offer(conn, frame, notification_id, live=True)
 
 manager = ConnectionManager()
+backplane.subscribe("notifications", manager.deliver_local)
+
+# --- Caixa de Entrada ---
+# Notificações visíveis ao usuário: as endereçadas a ele e os anúncios
+# (broadcast) criados depois do cadastro da conta.
+def _inbox_query(user: models.User):
+    recipient = models.NotificationRecipient
+    return select(models.Notification).where(or_(
+        and_(models.Notification.broadcast == True, models.Notification.createdAt >= user.createdAt),
+        models.Notification.id.in_(select(recipient.notificationId).where(recipient.userId == user.id)),
+    ))
+
+def _inbox_payload(row: models.Notification) -> dict:
+    return {**json.loads(row.payload), "notification_id": row.id}
+
+async def _get_cursor(db: AsyncSession, user_id: int) -> int:
+    cursor = await db.get(models.NotificationCursor, user_id)
+    return cursor.lastNotificationId if cursor else 0
+
+async def _advance_cursor(db: AsyncSession, user_id: int, last_id: int) -> None:
+    # O cursor só avança (acks fora de ordem ou de outro worker não o recuam).
+    cursor = models.NotificationCursor
+    updated = await db.execute(
+        update(cursor)
+        .where(cursor.userId == user_id, cursor.lastNotificationId < last_id)
+        .values(lastNotificationId=last_id)
+    )
+    if not updated.rowcount and await db.get(cursor, user_id) is None:
+        db.add(cursor(userId=user_id, lastNotificationId=last_id))
+    try:
+        await db.commit()
+    except IntegrityError:
+        # Outro worker criou o cursor ao mesmo tempo; repete como UPDATE.
+        await db.rollback()
+        await db.execute(
+            update(cursor)
+            .where(cursor.userId == user_id, cursor.lastNotificationId < last_id)
+            .values(lastNotificationId=last_id)
+        )
+        await db.commit()
+
+async def save_notification_cursor(user_id: int, last_id: int) -> None:
+    try:
+        async with AsyncSessionLocal() as db:
+            await _advance_cursor(db, user_id, last_id)
+    except Exception:
+        logger.exception("Falha ao gravar o cursor de notificações do usuário %s", user_id)
+
+async def deliver_inbox(conn: ClientConnection, user: models.User) -> tuple[int, bool]:
+    """
+    Envia as notificações pendentes (após o cursor do usuário), das mais
+    antigas para as mais novas, até NOTIFICATION_REPLAY_LIMIT. Retorna a
+    quantidade enviada e se ainda há pendentes (disponíveis via REST).
+    Libera os frames retidos por `ConnectionManager.register`.
+    """
+    limit = settings.NOTIFICATION_REPLAY_LIMIT
+    try:
+        async with AsyncSessionLocal() as db:
+            last_ack = await _get_cursor(db, user.id)
+            rows = (await db.execute(
+                _inbox_query(user)
+                .where(models.Notification.id > last_ack)
+                .order_by(models.Notification.id.asc())
+                .limit(limit + 1)
+            )).scalars().all()
+    finally:
+        held = conn.release()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    manager.offer_inbox(conn, rows, complete=not has_more, held=held)
+    return len(rows), has_more
+
+@router.get("/", response_model=schemas.NotificationPage)
+async def list_notifications(
+    before_id: int | None = Query(None, description="Cursor: notificações com id menor que este"),
+    limit: int = Query(NOTIFICATION_PAGE_DEFAULT, ge=1, le=NOTIFICATION_PAGE_MAX),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: models.User = Depends(get_current_user),
+):
+    """
+    Caixa de entrada paginada por cursor (mais recentes primeiro). Alternativa
+    ao WebSocket para clientes que não mantêm o socket aberto.
+    """
+    query = _inbox_query(current_user)
+    if before_id is not None:
+        query = query.where(models.Notification.id < before_id)
+    rows = (await db.execute(query.order_by(models.Notification.id.desc()).limit(limit + 1))).scalars().all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    return schemas.NotificationPage(
+        items=[
+            schemas.NotificationItem(id=row.id, type=row.type, data=json.loads(row.payload), createdAt=row.createdAt)
+            for row in rows
+        ],
+        next_cursor=rows[-1].id if has_more else None,
+        last_ack_id=await _get_cursor(db, current_user.id),
+    )
+
+@router.post("/ack", status_code=status.HTTP_204_NO_CONTENT)
+async def ack_notifications(ack: schemas.NotificationAck, db: AsyncSession = Depends(get_async_db), current_user: models.User = Depends(get_current_user)):
+    """Confirma o recebimento das notificações até `last_id` (inclusive)."""
+    await _advance_cursor(db, current_user.id, ack.last_id)
 
 @router.websocket("/ws")
-async def websocket_endpoint(websocket: WebSocket, token: str, db: Session = Depends(get_db)):
-    payload = decode_token(token)
-    if not payload:
-        await websocket.close(code=1008)
-        return
-    
-    user_registration = payload.get("sub")
-    user = db.query(models.User).filter(models.User.registration == user_registration).first()
-    
+async def websocket_endpoint(websocket: WebSocket, token: str, heartbeat: bool = False):
+    # A autenticação usa o cache de tokens ou uma sessão assíncrona de curta
+    # duração; nenhuma conexão do pool fica presa enquanto o socket está aberto.
+    # Heartbeat e timeout de inatividade são opcionais (`?heartbeat=true`):
+    # clientes antigos tratam todo frame recebido como notificação e nunca
+    # enviam nada ao servidor.
+    user = await authenticate_token(token)
     if not user:
         await websocket.close(code=1008)
         return
     
-    await manager.connect(websocket, user.id)
-    
+    conn = await manager.connect(websocket, user.id, heartbeat=heartbeat)
     try:
+        # Dentro do try: uma falha ao ler a caixa de entrada também remove a
+        # conexão do manager.
+        await deliver_inbox(conn, user)
         while True:
-            await websocket.receive_text()
+            await conn.receive()
     except WebSocketDisconnect:
-        manager.disconnect(websocket, user.id)
+        pass
+    finally:
+        await manager.disconnect(conn, user.id)
 
 async def notify_new_message(chat_id: int, sender_id: int, content: str, db: Session):
     conversation = db.query(models.Conversation).filter(models.Conversation.id == chat_id).first()
@@ -80,16 +294,24 @@ async def notify_new_message(chat_id: int, sender_id: int, content: str, db: Ses
     
     await manager.broadcast_to_users(notification, recipient_ids)
 
-async def notify_new_announcement(post_id: int, title: str, author_name: str, db: Session):
-    users = db.query(models.User).filter(models.User.accessStatus == models.AccessStatus.active).all()
-    user_ids = [u.id for u in users]
-    
-    notification = {
+def _announcement(post_id: int, title: str, author_name: str) -> dict:
+    return {
         "type": "announcement",
         "post_id": post_id,
         "title": title,
         "author_name": author_name,
         "timestamp": datetime.utcnow().isoformat()
     }
-    
-    await manager.broadcast_to_users(notification, user_ids)
+
+async def notify_new_announcement(post_id: int, title: str, author_name: str):
+    # Apenas usuários conectados recebem o anúncio em tempo real (o custo é
+    # proporcional às conexões abertas, não ao total de usuários).
+    await manager.broadcast_to_connected(_announcement(post_id, title, author_name))
+
+def dispatch_announcement(post_id: int, title: str, author_name: str) -> bool:
+    """
+    Versão síncrona e não bloqueante de `notify_new_announcement`: enfileira
+    o anúncio no gravador da caixa de entrada, que o grava e publica no
+    backplane.
+    """
+    return inbox_writer.emit("notifications", {"connected": True, "message": _announcement(post_id, title, author_name)})
@@ -13,11 +13,14 @@ Suas responsabilidades incluem:
   privilegiados (coordenador, admin).
 """
 from fastapi import APIRouter, Depends, HTTPException, status, Response
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
 from typing import List
-from ..db import get_db
+from ..db import get_async_db
 from .. import schemas, models
 from ..utils import require_roles
+from .notifications import dispatch_announcement
 
 # --- Configuração do Roteador de Publicações ---
 # O `APIRouter` agrupa as rotas de gerenciamento de publicações sob o
@@ -27,43 +30,55 @@ router = APIRouter(
     tags=["Publications"]
 )
 
+# --- Função Auxiliar ---
+# A resposta inclui o autor (`PostResponse.author`); como a sessão assíncrona
+# não faz lazy loading, o relacionamento é carregado junto com o post.
+async def _get_post(db: AsyncSession, post_id: int) -> models.Post | None:
+    result = await db.execute(
+        select(models.Post).options(selectinload(models.Post.author)).where(models.Post.id == post_id)
+    )
+    return result.scalars().first()
+
 # --- Rota: Criar Nova Publicação ---
 # Endpoint protegido (Professor/Coordenador/Admin) para criar uma nova
 # publicação. O autor é automaticamente definido como o usuário logado.
 @router.post("/", response_model=schemas.PostResponse, status_code=status.HTTP_201_CREATED)
-def create_post(
+async def create_post(
     post: schemas.PostCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: models.User = Depends(require_roles(["teacher", "coordinator", "admin"]))
 ):
     new_post = models.Post(title=post.title, content=post.content, authorId=current_user.id)
     db.add(new_post)
-    db.commit()
-    db.refresh(new_post)
-    return new_post
+    await db.commit()
+    # Anúncio em tempo real para os usuários conectados (não bloqueia a resposta).
+    dispatch_announcement(new_post.id, new_post.title, current_user.name)
+    return await _get_post(db, new_post.id)
 
 # --- Rota: Listar Todas as Publicações ---
 # Endpoint que retorna uma lista de todas as publicações, ordenadas da mais
 # recente para a mais antiga. Acessível a todos os usuários logados.
 @router.get("/", response_model=List[schemas.PostResponse])
-def get_all_posts(
-    db: Session = Depends(get_db),
+async def get_all_posts(
+    db: AsyncSession = Depends(get_async_db),
     current_user: models.User = Depends(require_roles(["student", "teacher", "coordinator", "admin"]))
 ):
-    posts = db.query(models.Post).order_by(models.Post.date.desc()).all()
-    return posts
+    result = await db.execute(
+        select(models.Post).options(selectinload(models.Post.author)).order_by(models.Post.date.desc())
+    )
+    return result.scalars().all()
 
 # --- Rota: Editar uma Publicação ---
 # Endpoint protegido para atualizar o conteúdo de uma publicação. A permissão
 # é concedida se o usuário for o autor original ou um Coordenador/Admin.
 @router.patch("/{post_id}", response_model=schemas.PostResponse)
-def update_post(
+async def update_post(
     post_id: int,
     post_update: schemas.PostUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: models.User = Depends(require_roles(["teacher", "coordinator", "admin"]))
 ):
-    db_post = db.query(models.Post).filter(models.Post.id == post_id).first()
+    db_post = await _get_post(db, post_id)
     if not db_post:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Publicação não encontrada")
 
@@ -77,8 +92,7 @@ def update_post(
     for key, value in update_data.items():
         setattr(db_post, key, value)
     
-    db.commit()
-    db.refresh(db_post)
+    await db.commit()
     return db_post
 
 # --- Rota: Deletar uma Publicação ---
@@ -86,12 +100,12 @@ def update_post(
 # permissão da rota de edição: apenas o autor ou um Coordenador/Admin
 # pode deletar o post.
 @router.delete("/{post_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_post(
+async def delete_post(
     post_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: models.User = Depends(require_roles(["teacher", "coordinator", "admin"]))
 ):
-    db_post = db.query(models.Post).filter(models.Post.id == post_id).first()
+    db_post = await db.get(models.Post, post_id)
     if not db_post:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Publicação não encontrada")
     
@@ -101,6 +115,6 @@ def delete_post(
     if not is_author and not is_privileged:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Não tem permissão para deletar esta publicação")
 
-    db.delete(db_post)
-    db.commit()
+    await db.delete(db_post)
+    await db.commit()
     return Response(status_code=status.HTTP_204_NO_CONTENT)
@@ -0,0 +1,296 @@
+# ---------------- WEBSOCKET MULTIPLEXADO POR USUÁRIO ---------------- #
+"""
+Este arquivo, realtime.py, expõe um único WebSocket autenticado por usuário
+(`/ws?token=...`) que transporta os eventos de todos os chats assinados e as
+notificações. Ele substitui a combinação de um socket por chat
+(`/chats/ws/{chat_id}`) e um de notificações (`/notifications/ws`), que
+continuam disponíveis para clientes antigos.
+
+A conexão é registrada nas mesmas estruturas dos sockets antigos: no mapa
+`chat_ws._connections` para cada chat assinado e no `ConnectionManager` de
+notificações. Assim, o fan-out via backplane não muda.
+
+Comandos do cliente (JSON, ou MessagePack se negociado):
+- {"type": "subscribe", "chat_id": 1, "last_seq": 10, "epoch": "...", "last_message_id": 99}
+  (`last_seq`, `epoch` e `last_message_id` são opcionais; ver replay.py)
+- {"type": "unsubscribe", "chat_id": 1}
+- {"type": "ping"} / {"type": "pong"}
+  O servidor também envia `ping` periodicamente; o cliente deve responder
+  (com `pong` ou qualquer outro frame) para não ser desconectado por
+  inatividade (código 4009).
+- {"type": "message:send", "chat_id": 1, "client_id": "uuid gerado no cliente", "content": "..."}
+  Grava a mensagem e responde com `message:ack` (mesmo `client_id` e a
+  mensagem gravada). Reenvios do mesmo `client_id` dentro de alguns minutos
+  recebem o mesmo ack, sem gravar de novo.
+- {"type": "typing", "chat_id": 1}
+  Indica que o usuário está digitando em um chat assinado (ver presence.py).
+- {"type": "notifications:ack", "last_id": 42}
+  Confirma as notificações recebidas até `last_id` (ver inbox.py). Ao
+  desconectar, o servidor também avança o cursor até a última enviada sem
+  lacunas (ver notifications.py).
+
+Eventos do servidor:
+- `ready`: enviado após a autenticação, com as contagens de não lidas.
+- notificações pendentes da caixa de entrada, seguidas de um frame `inbox`
+  (`delivered`, `has_more`; se `has_more`, use GET /notifications).
+- `subscribed`, `unsubscribed`, `pong`, `message:ack`, `error`.
+  `unsubscribed` com `"reason": "removed"` indica que o usuário deixou de
+  participar da conversa; a assinatura foi cancelada pelo servidor.
+- `presence` (participantes dos chats assinados que ficaram online/offline;
+  ao assinar um chat, `chat_id` e a lista dos participantes online) e
+  `typing`.
+- Os mesmos eventos dos sockets antigos (`message:new`, `sync`, notificações).
+"""
+import json
+import logging
+
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect
+
+from .. import models, utils
+from ..cache import TTLCache
+from ..config import settings
+from ..connections import ClientConnection
+from ..conversation_routes import ConversationRoute, get_route, remember_subchannel
+from ..db import AsyncSessionLocal
+from ..framing import decode_msgpack, negotiate_encoding
+from ..presence import presence
+from .chat import _create_message, _get_or_create_default_subchannel, _unread_counts
+from .chat_ws import _replay_missed, register_connection, unregister_connection
+from .notifications import deliver_inbox, manager, save_notification_cursor
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(tags=["Realtime"])
+
+CLIENT_ID_MAX_LENGTH = 64
+
+# Acks recentes por (usuário, client_id): um reenvio após queda da conexão
+# recebe o mesmo ack em vez de duplicar a mensagem (dentro deste worker).
+_recent_sends = TTLCache(maxsize=10000, ttl=300)
+
+
+class InvalidCommand(Exception):
+    pass
+
+
+# --- Estado da Conexão ---
+# A participação em cada chat e o subcanal padrão vêm da rota da conversa em
+# cache (conversation_routes.py), compartilhada com as rotas HTTP e
+# invalidada quando os participantes mudam.
+# `participants` guarda os participantes dos chats assinados, acompanhados
+# pelo serviço de presença.
+class RealtimeSession:
+    def __init__(self, conn: ClientConnection, user: models.User):
+        self.conn = conn
+        self.user = user
+        self.subscriptions: set[int] = set()
+        self.participants: dict[int, frozenset[int]] = {}
+        conn.on_revoke = self.revoke
+
+    async def member_route(self, chat_id: int, detail: str) -> ConversationRoute:
+        route = await get_route(chat_id)
+        if route is None or not route.is_participant(self.user.id):
+            raise InvalidCommand(detail)
+        return route
+
+    def update_watch(self) -> None:
+        presence.watch(self.conn, set().union(*self.participants.values()))
+
+    def revoke(self, chat_id: int) -> None:
+        # O usuário saiu da conversa (chat_ws já removeu a conexão do chat).
+        if chat_id not in self.subscriptions:
+            return
+        self.subscriptions.discard(chat_id)
+        self.participants.pop(chat_id, None)
+        self.update_watch()
+        self.conn.offer({"type": "unsubscribed", "chat_id": chat_id, "reason": "removed"})
+
+    def close_subscriptions(self) -> None:
+        for chat_id in self.subscriptions:
+            unregister_connection(chat_id, self.conn)
+        self.subscriptions.clear()
+        self.participants.clear()
+        presence.unwatch(self.conn)
+
+
+async def _receive_command(conn: ClientConnection) -> dict:
+    message = await conn.receive()
+    try:
+        if message.get("bytes") is not None:
+            command = decode_msgpack(message["bytes"])
+        else:
+            command = json.loads(message.get("text") or "")
+    except Exception:
+        raise InvalidCommand("Frame inválido")
+    if not isinstance(command, dict):
+        raise InvalidCommand("Frame inválido")
+    return command
+
+
+def _int_field(command: dict, key: str, required: bool = False) -> int | None:
+    value = command.get(key)
+    if value is None and not required:
+        return None
+    if not isinstance(value, int) or isinstance(value, bool):
+        raise InvalidCommand(f"{key} inválido")
+    return value
+
+
+# --- Comandos ---
+async def _subscribe(session: RealtimeSession, command: dict) -> None:
+    chat_id = _int_field(command, "chat_id", required=True)
+    last_seq = _int_field(command, "last_seq")
+    last_message_id = _int_field(command, "last_message_id")
+    epoch = command.get("epoch") if isinstance(command.get("epoch"), str) else None
+    if chat_id in session.subscriptions:
+        session.conn.offer({"type": "subscribed", "chat_id": chat_id})
+        return
+    if len(session.subscriptions) >= settings.WS_MAX_SUBSCRIPTIONS:
+        raise InvalidCommand("Limite de chats assinados atingido")
+    route = await session.member_route(chat_id, "Você não participa desta conversa")
+
+    # Registro e consulta ao buffer de replay sem `await` entre eles, para
+    # que nenhum evento caia na lacuna entre o replay e a entrega ao vivo.
+    # Quando a lacuna exige o banco, `_replay_missed` retém os eventos ao
+    # vivo durante a consulta e descarta os já reenviados.
+    register_connection(chat_id, session.conn)
+    session.subscriptions.add(chat_id)
+    session.participants[chat_id] = route.participant_ids
+    session.update_watch()
+    session.conn.offer({"type": "subscribed", "chat_id": chat_id})
+    session.conn.offer({"type": "presence", "chat_id": chat_id, "online": presence.snapshot(route.participant_ids)})
+    await _replay_missed(session.conn, chat_id, last_seq, epoch, last_message_id)
+
+
+async def _unsubscribe(session: RealtimeSession, command: dict) -> None:
+    chat_id = _int_field(command, "chat_id", required=True)
+    if chat_id in session.subscriptions:
+        session.subscriptions.discard(chat_id)
+        unregister_connection(chat_id, session.conn)
+        session.participants.pop(chat_id, None)
+        session.update_watch()
+    session.conn.offer({"type": "unsubscribed", "chat_id": chat_id})
+
+
+async def _ping(session: RealtimeSession, command: dict) -> None:
+    session.conn.offer({"type": "pong"})
+
+
+async def _pong(session: RealtimeSession, command: dict) -> None:
+    # Resposta ao heartbeat do servidor; basta ter recebido o frame.
+    pass
+
+
+async def _send_message(session: RealtimeSession, command: dict) -> None:
+    chat_id = _int_field(command, "chat_id", required=True)
+    client_id = command.get("client_id")
+    if not isinstance(client_id, str) or not client_id or len(client_id) > CLIENT_ID_MAX_LENGTH:
+        raise InvalidCommand("client_id inválido")
+    content = command.get("content")
+    if not isinstance(content, str):
+        raise InvalidCommand("Conteúdo inválido")
+
+    key = (session.user.id, client_id)
+    ack = _recent_sends.get(key)
+    if ack is not None:
+        session.conn.offer(ack)
+        return
+    route = await session.member_route(chat_id, "Você não pode enviar mensagens para esta conversa")
+
+    subchannel_id = route.subchannel_id
+    try:
+        async with AsyncSessionLocal() as db:
+            if subchannel_id is None:
+                subchannel_id = (await _get_or_create_default_subchannel(db, chat_id)).id
+            payload = await _create_message(db, chat_id, subchannel_id, session.user, content, client_id)
+    except Exception:
+        logger.exception("Falha ao gravar mensagem do chat %s", chat_id)
+        raise InvalidCommand("Não foi possível enviar a mensagem")
+    if route.subchannel_id is None:
+        remember_subchannel(route, subchannel_id)
+
+    ack = {"type": "message:ack", "chat_id": chat_id, "client_id": client_id, "message": payload["message"]}
+    _recent_sends.set(key, ack)
+    session.conn.offer(ack)
+
+
+async def _typing(session: RealtimeSession, command: dict) -> None:
+    chat_id = _int_field(command, "chat_id", required=True)
+    if chat_id not in session.subscriptions:
+        raise InvalidCommand("Assine o chat antes de enviar eventos de digitação")
+    presence.typing(chat_id, session.user.id)
+
+
+async def _ack_notifications(session: RealtimeSession, command: dict) -> None:
+    last_id = _int_field(command, "last_id", required=True)
+    await save_notification_cursor(session.user.id, last_id)
+
+
+COMMANDS = {
+    "subscribe": _subscribe,
+    "unsubscribe": _unsubscribe,
+    "ping": _ping,
+    "pong": _pong,
+    "message:send": _send_message,
+    "typing": _typing,
+    "notifications:ack": _ack_notifications,
+}
+
+
+@router.websocket("/ws")
+async def websocket_endpoint(websocket: WebSocket, token: str = None):
+    """
+    WebSocket único do usuário: chats assinados sob demanda e notificações.
+    """
+    user = await utils.authenticate_token(token)
+    if user is None:
+        await websocket.close(code=1008)
+        return
+
+    # Contagens de não lidas de todas as conversas do usuário (frame `ready`).
+    async with AsyncSessionLocal() as db:
+        unread = await _unread_counts(db, user.id)
+
+    encoding, subprotocol = negotiate_encoding(websocket)
+    await websocket.accept(subprotocol=subprotocol)
+    conn = ClientConnection(websocket, encoding, user_id=user.id)
+    conn.start()
+    # Antes do registro: a partir dele os frames ficam retidos até a caixa
+    # de entrada ser enfileirada, e o `ready` deve ser o primeiro.
+    conn.offer({
+        "type": "ready",
+        "user_id": user.id,
+        "encoding": encoding,
+        "unread": [{"chat_id": chat_id, "unread_count": count} for chat_id, count in unread.items()],
+    })
+    manager.register(conn, user.id)
+    session = RealtimeSession(conn, user)
+
+    try:
+        # Dentro do try: uma falha ao ler a caixa de entrada também remove a
+        # conexão do manager e da presença.
+        delivered, has_more = await deliver_inbox(conn, user)
+        conn.offer({"type": "inbox", "delivered": delivered, "has_more": has_more})
+        while True:
+            command = {}
+            try:
+                command = await _receive_command(conn)
+                handler = COMMANDS.get(command.get("type"))
+                if handler is None:
+                    raise InvalidCommand("Comando desconhecido")
+                await handler(session, command)
+            except InvalidCommand as exc:
+                conn.offer({
+                    "type": "error",
+                    "detail": str(exc),
+                    "command": command.get("type"),
+                    "chat_id": command.get("chat_id"),
+                    "client_id": command.get("client_id"),
+                })
+    except WebSocketDisconnect:
+        pass
+    except Exception:
+        pass
+    finally:
+        session.close_subscriptions()
+        await manager.disconnect(conn, user.id)
@@ -3,6 +3,7 @@ from sqlalchemy.orm import Session
 from typing import List
 
 from .. import models, schemas, utils
+from ..conversation_routes import invalidate_route
 from ..db import get_db
 
 router = APIRouter(prefix="/subchannels", tags=["Subchannels"])
@@ -42,6 +43,7 @@ def create_subchannel(channel_id: int, data: schemas.SubchannelCreate, db: Sessi
     db.add(new_sub)
     db.commit()
     db.refresh(new_sub)
+    invalidate_route(channel.conversationId)
     return new_sub
 
 
@@ -82,3 +84,4 @@ def delete_subchannel(subchannel_id: int, db: Session = Depends(get_db), current
 
     db.delete(sub)
     db.commit()
+    invalidate_route(channel.conversationId)
@@ -80,6 +80,7 @@ def update_profile(
 
     db.commit()
     db.refresh(current_user)
+    utils.invalidate_user_cache(current_user.id)
     return current_user
 
 # --- Rota: Atualizar Outro Usuário (Admin) ---
@@ -100,11 +101,12 @@ def update_user(
     
     db.commit()
     db.refresh(db_user)
+    utils.invalidate_user_cache(db_user.id)
     return db_user
 
 # --- Rota: Deletar um Usuário (Admin) ---
 # Endpoint protegido (somente Admin) para remover um usuário. Também remove
-# todas as sessões ativas associadas a esse usuário.
+# todas as sessões ativas associadas a esse usuário (e do cache de autenticação).
 @router.delete("/{user_id}")
 def delete_user(
     user_id: int, db: Session = Depends(get_db),
@@ -117,6 +119,7 @@ def delete_user(
     db.query(models.Session).filter(models.Session.userId == db_user.id).delete()
     db.delete(db_user)
     db.commit()
+    utils.invalidate_user_cache(user_id)
     return {"message": "Usuário deletado com sucesso"}
 
 # --- Rota: Atualizar Status de Acesso (Admin) ---
@@ -136,6 +139,7 @@ def update_user_status(
     db_user.accessStatus = status_update.accessStatus
     db.commit()
     db.refresh(db_user)
+    utils.invalidate_user_cache(db_user.id)
     return db_user
 
 # --- Rota: Atualizar Papel do Usuário (Admin/Coordenador) ---
@@ -170,4 +174,5 @@ def update_user_role(
     db_user.role = role_update.role
     db.commit()
     db.refresh(db_user)
+    utils.invalidate_user_cache(db_user.id)
     return db_user
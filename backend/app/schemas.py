@@ -136,6 +136,32 @@ class Message(MessageBase):
     authorName: Optional[str] = None  # <- Nome do autor
     model_config = ConfigDict(from_attributes=True)
 
+# Página de mensagens (paginação por cursor). Os itens vêm em ordem
+# cronológica; `next_cursor` deve ser enviado como `before_id` para buscar
+# mensagens mais antigas e `prev_cursor` como `after_id` para as mais novas.
+# `last_read_id` é o cursor de leitura do usuário antes desta requisição,
+# útil para posicionar o separador de "novas mensagens".
+class MessagePage(BaseModel):
+    items: List[Message]
+    next_cursor: Optional[int] = None
+    prev_cursor: Optional[int] = None
+    last_read_id: Optional[int] = None
+
+# Resultado da busca nas mensagens, ordenado por relevância (`score`: termos
+# da consulta presentes na mensagem) e, no empate, pelas mais recentes.
+# `next_cursor` deve ser enviado como `cursor` para buscar a próxima página.
+# `truncated` indica que algum termo tem mais ocorrências que o teto lido por
+# termo (SEARCH_MAX_CANDIDATES): mensagens mais antigas podem ter ficado de fora.
+class MessageSearchHit(BaseModel):
+    chat_id: int
+    score: int
+    message: Message
+
+class MessageSearchPage(BaseModel):
+    items: List[MessageSearchHit]
+    next_cursor: Optional[str] = None
+    truncated: bool = False
+
 # --- Esquemas para Conversas (Chat) ---
 class UserSimple(BaseModel):
     id: int
@@ -147,8 +173,18 @@ class Chat(BaseModel):
     title: str
     participants: List[UserSimple]
     last_message: Optional[Message] = None
+    message_count: int = 0
+    unread_count: int = 0
     model_config = ConfigDict(from_attributes=True)
 
+class ChatUnread(BaseModel):
+    chat_id: int
+    unread_count: int
+
+class UnreadCounts(BaseModel):
+    total: int
+    chats: List[ChatUnread]
+
 class SubchannelBase(BaseModel):
     name: str
 
@@ -176,4 +212,19 @@ class Channel(ChannelBase):
     subchannelsList: List[Subchannel] = []
 
     class Config:
-        orm_mode = True
\ No newline at end of file
+        orm_mode = True
+
+# --- Esquemas para a Caixa de Entrada de Notificações ---
+class NotificationItem(BaseModel):
+    id: int
+    type: str
+    data: dict
+    createdAt: datetime
+
+class NotificationPage(BaseModel):
+    items: List[NotificationItem]
+    next_cursor: Optional[int] = None
+    last_ack_id: int = 0
+
+class NotificationAck(BaseModel):
+    last_id: int = Field(..., ge=0)
@@ -0,0 +1,161 @@
+# ---------------- BUSCA NAS MENSAGENS DOS CHATS ---------------- #
+"""
+Este arquivo, search.py, implementa a busca textual nas mensagens dos chats
+com um índice invertido próprio (tabela `MessageTerm`), que funciona igual
+no MySQL e no SQLite.
+
+Indexação:
+- O texto é normalizado (minúsculas, sem acentos) e dividido em termos;
+  palavras muito curtas e as mais comuns do português são ignoradas.
+- Cada termo distinto de uma mensagem vira uma linha (termo, conversa,
+  mensagem), gravada na mesma transação do INSERT da mensagem.
+- Mensagens antigas são indexadas com
+  `python -m backend.app.maintenance reindex-search`.
+- Mensagens arquivadas (MessageArchive) saem do índice: a busca cobre as
+  mensagens ainda em Message.
+
+Busca:
+- Apenas nas conversas das quais o usuário participa.
+- Cada termo da consulta lê no máximo `SEARCH_MAX_CANDIDATES` ocorrências,
+  as mais recentes, nessas conversas: em uma conversa pela chave (termo,
+  conversa, mensagem); em todas pelo índice (termo, mensagem), já na ordem,
+  filtrando as conversas do usuário. O custo é limitado pelo teto, e não
+  pelo tamanho da tabela Message.
+- O teto limita a cobertura: ocorrências mais antigas que as
+  `SEARCH_MAX_CANDIDATES` mais recentes de um termo ficam fora do
+  resultado, mesmo que a mensagem tenha todos os termos. A resposta indica
+  isso com `truncated`; o cliente pode refinar a consulta ou filtrar por chat.
+- Ranking: número de termos da consulta presentes na mensagem e, no empate,
+  as mais recentes primeiro. A paginação usa o cursor "pontuação:id".
+"""
+import re
+import unicodedata
+
+from sqlalchemy import and_, func, insert, or_, select, union_all
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import models
+from .config import settings
+
+TERM_MIN_LENGTH = 2
+TERM_MAX_LENGTH = 64
+MAX_TERMS_PER_MESSAGE = 256
+
+STOPWORDS = frozenset({
+    "ao", "aos", "as", "com", "como", "da", "das", "de", "do", "dos", "ela", "ele", "em", "era", "eu",
+    "foi", "ha", "isso", "ja", "mais", "mas", "me", "na", "nao", "nas", "no", "nos", "os", "ou", "para",
+    "pela", "pelo", "por", "pra", "que", "se", "sem", "ser", "so", "sua", "seu", "tem", "um", "uma", "voce",
+})
+
+_WORD = re.compile(r"\w+")
+
+
+# --- Termos ---
+def normalize(text: str) -> str:
+    decomposed = unicodedata.normalize("NFKD", text.lower())
+    return "".join(char for char in decomposed if not unicodedata.combining(char))
+
+
+def tokenize(text: str, limit: int = MAX_TERMS_PER_MESSAGE) -> list[str]:
+    """Termos distintos do texto, na ordem em que aparecem."""
+    terms: dict[str, None] = {}
+    for word in _WORD.findall(normalize(text)):
+        if len(word) < TERM_MIN_LENGTH or word in STOPWORDS:
+            continue
+        terms[word[:TERM_MAX_LENGTH]] = None
+        if len(terms) >= limit:
+            break
+    return list(terms)
+
+
+def index_rows(chat_id: int, message_id: int, content: str) -> list[dict]:
+    return [{"term": term, "conversationId": chat_id, "messageId": message_id} for term in tokenize(content)]
+
+
+async def index_messages(db: AsyncSession, entries: list[tuple[int, int, str]]) -> None:
+    """Indexa (chat_id, message_id, conteúdo) na transação atual, com um único INSERT em massa."""
+    rows = [row for chat_id, message_id, content in entries for row in index_rows(chat_id, message_id, content)]
+    if rows:
+        await db.execute(insert(models.MessageTerm), rows)
+
+
+# --- Cursor de Paginação ---
+def encode_cursor(score: int, message_id: int) -> str:
+    return f"{score}:{message_id}"
+
+
+def decode_cursor(cursor: str) -> tuple[int, int]:
+    """Lança ValueError se o cursor for inválido."""
+    score, message_id = cursor.split(":")
+    return int(score), int(message_id)
+
+
+# --- Consulta ---
+async def search_messages(
+    db: AsyncSession,
+    user_id: int,
+    terms: list[str],
+    chat_id: int | None = None,
+    cursor: tuple[int, int] | None = None,
+    limit: int = 20,
+) -> tuple[list[tuple[int, int, models.Message, str | None]], str | None, bool]:
+    """
+    Retorna [(pontuação, chat_id, mensagem, nome do autor)], o cursor da
+    próxima página (ou None) e se algum termo atingiu SEARCH_MAX_CANDIDATES.
+    """
+    cp = models.conversation_participants
+    term_table = models.MessageTerm
+    cap = settings.SEARCH_MAX_CANDIDATES
+
+    # Ocorrências mais recentes de cada termo nas conversas do usuário (uma a
+    # mais que o teto, para saber se ele foi atingido).
+    postings = []
+    for term in terms:
+        recent = select(term_table.messageId, term_table.conversationId).where(term_table.term == term)
+        if chat_id is not None:
+            recent = recent.where(term_table.conversationId == chat_id)
+        else:
+            recent = recent.join(cp, and_(cp.c.conversationId == term_table.conversationId, cp.c.userId == user_id))
+        recent = recent.order_by(term_table.messageId.desc()).limit(cap + 1).subquery()
+        rank = func.row_number().over(order_by=recent.c.messageId.desc())
+        postings.append(select(recent.c.messageId, recent.c.conversationId, rank.label("rank")))
+    candidates = (union_all(*postings) if len(postings) > 1 else postings[0]).subquery()
+    # O maior rank entre todas as ocorrências (calculado antes de descartar a
+    # extra de cada termo) indica se algum termo atingiu o teto; segue como
+    # coluna até o resultado, sem uma segunda leitura dos postings.
+    flagged = select(
+        candidates.c.messageId,
+        candidates.c.conversationId,
+        candidates.c.rank,
+        func.max(candidates.c.rank).over().label("max_rank"),
+    ).subquery()
+
+    score = func.count()
+    ranked = (
+        select(
+            flagged.c.messageId,
+            flagged.c.conversationId,
+            score.label("score"),
+            func.max(flagged.c.max_rank).label("max_rank"),
+        )
+        .where(flagged.c.rank <= cap)
+        .group_by(flagged.c.messageId, flagged.c.conversationId)
+    )
+    if cursor is not None:
+        last_score, last_id = cursor
+        ranked = ranked.having(or_(score < last_score, and_(score == last_score, flagged.c.messageId < last_id)))
+    # Busca um item a mais (limit + 1) para saber se existe outra página.
+    ranked = ranked.order_by(score.desc(), flagged.c.messageId.desc()).limit(limit + 1).subquery()
+
+    rows = (await db.execute(
+        select(ranked.c.score, ranked.c.conversationId, models.Message, models.User.name, ranked.c.max_rank)
+        .join(models.Message, models.Message.id == ranked.c.messageId)
+        .outerjoin(models.User, models.User.id == models.Message.authorId)
+        .order_by(ranked.c.score.desc(), ranked.c.messageId.desc())
+    )).all()
+
+    truncated = bool(rows) and rows[0].max_rank > cap
+    has_more = len(rows) > limit
+    rows = [tuple(row)[:4] for row in rows[:limit]]
+    next_cursor = encode_cursor(rows[-1][0], rows[-1][2].id) if has_more else None
+    return rows, next_cursor, truncated
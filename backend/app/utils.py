@@ -8,19 +8,25 @@ Suas responsabilidades incluem:
 - Configurar o hashing de senhas com `bcrypt` via `passlib`.
 - Fornecer funções para criar, decodificar e validar senhas e tokens JWT.
 - Definir a dependência principal do FastAPI (`get_current_user`) para
-  proteger rotas e identificar o usuário logado.
+  proteger rotas e identificar o usuário logado, com um cache em memória
+  (token -> usuário/sessão) que evita consultas repetidas ao banco.
 - Criar uma "fábrica de dependências" (`require_roles`) para implementar o
   controle de acesso baseado em papéis (Role-Based Access Control - RBAC).
 """
 from datetime import datetime, timedelta
 from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
+from sqlalchemy import inspect, select
+from sqlalchemy.orm import Session, make_transient_to_detached
 from jose import JWTError, jwt
-from .db import get_db
+from .db import AsyncSessionLocal, get_db
 from . import models
+from .backplane import backplane
+from .cache import TTLCache
 from .config import settings
+from .dispatch import dispatcher
 
 # --- Configuração e Contexto de Segurança ---
 # `pwd_context` inicializa o `passlib` para usar o algoritmo bcrypt.
@@ -84,20 +90,61 @@ credentials_exception = HTTPException(
     headers={"WWW-Authenticate": "Bearer"},
 )
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> models.User:
+# --- Cache de Autenticação ---
+# Guarda, por token, uma cópia das colunas do usuário e a expiração da sessão.
+# Um acerto no cache não executa nenhuma consulta: o usuário é reconstruído e
+# anexado à sessão da requisição com `merge(load=False)`, permitindo que as
+# rotas continuem alterando e salvando `current_user` normalmente.
+# As entradas usam o id do usuário como tag, para que alterações de perfil,
+# status, papel ou exclusão invalidem todos os tokens daquele usuário.
+auth_cache = TTLCache(maxsize=settings.AUTH_CACHE_MAX_SIZE, ttl=settings.AUTH_CACHE_TTL_SECONDS)
+AUTH_CACHE_TOPIC = "auth_cache"
+
+_user_columns = [attr.key for attr in inspect(models.User).column_attrs]
+
+# As invalidações podem partir de rotas síncronas (threadpool): a remoção
+# local é imediata e o aviso aos outros workers passa pelo dispatcher
+# thread-safe, como em conversation_routes.invalidate_route.
+def invalidate_token_cache(token: str) -> None:
+    """Remove um token específico do cache de autenticação (ex.: logout)."""
+    auth_cache.pop(token)
+    dispatcher.emit(AUTH_CACHE_TOPIC, {"token": token})
+
+def invalidate_user_cache(user_id: int) -> None:
+    """Remove do cache todos os tokens associados a um usuário."""
+    auth_cache.invalidate_tag(user_id)
+    dispatcher.emit(AUTH_CACHE_TOPIC, {"user_id": user_id})
+
+async def _on_invalidate(message: dict) -> None:
+    if "token" in message:
+        auth_cache.pop(message["token"])
+    if "user_id" in message:
+        auth_cache.invalidate_tag(message["user_id"])
+
+backplane.subscribe(AUTH_CACHE_TOPIC, _on_invalidate)
+
+def _cache_user_session(token: str, user: models.User, expiration: datetime) -> None:
+    snapshot = {key: getattr(user, key) for key in _user_columns}
+    remaining = (expiration - datetime.utcnow()).total_seconds()
+    auth_cache.set(token, (snapshot, expiration), ttl=remaining, tag=user.id)
+
+def _user_from_cache(token: str, db: Session) -> models.User | None:
+    cached = auth_cache.get(token)
+    if cached is None:
+        return None
+    snapshot, expiration = cached
+    if expiration < datetime.utcnow():
+        auth_cache.pop(token)
+        return None
+    user = models.User(**snapshot)
+    make_transient_to_detached(user)
+    return db.merge(user, load=False)
+
+def _load_user_session(token: str, registration: str, db: Session) -> models.User:
     """
-    Dependência para obter o usuário atual a partir de um token JWT.
-    Valida o token, o usuário, o status de acesso e a sessão no banco de dados.
+    Consulta o usuário e a sessão no banco (caminho sem cache). Esta função é
+    síncrona e bloqueante, portanto deve ser executada no threadpool.
     """
-    payload = decode_token(token)
-    
-    if payload is None:
-        raise credentials_exception
-        
-    registration: str | None = payload.get("sub")
-    if registration is None:
-        raise credentials_exception
-
     user = db.query(models.User).filter(models.User.registration == registration).first()
     if user is None:
         raise credentials_exception
@@ -114,6 +161,75 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
             db.commit()
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Sessão inválida ou expirada")
 
+    _cache_user_session(token, user, session.expirationDate)
+    return user
+
+async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> models.User:
+    """
+    Dependência para obter o usuário atual a partir de um token JWT.
+    Valida o token, o usuário, o status de acesso e a sessão no banco de dados,
+    consultando primeiro o cache de autenticação.
+
+    O acerto no cache não faz I/O e roda direto no event loop. Já as consultas
+    ao banco (driver síncrono) são enviadas ao threadpool, para não bloquear o
+    loop compartilhado com os WebSockets.
+    """
+    payload = decode_token(token)
+    
+    if payload is None:
+        raise credentials_exception
+        
+    registration: str | None = payload.get("sub")
+    if registration is None:
+        raise credentials_exception
+
+    cached_user = _user_from_cache(token, db)
+    if cached_user is not None and cached_user.registration == registration:
+        if cached_user.accessStatus != models.AccessStatus.active:
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Acesso inativo")
+        return cached_user
+
+    return await run_in_threadpool(_load_user_session, token, registration, db)
+
+async def authenticate_token(token: str | None) -> models.User | None:
+    """
+    Autenticação fora do ciclo de requisição HTTP (WebSockets). Faz as mesmas
+    validações de `get_current_user`, mas retorna None em vez de lançar
+    HTTPException e devolve um usuário desanexado (apenas colunas).
+
+    Consulta primeiro o cache; no caminho sem cache usa uma sessão assíncrona
+    de curta duração, devolvida ao pool antes de a conexão entrar no loop de
+    mensagens, em vez de manter uma sessão aberta por socket.
+    """
+    payload = decode_token(token) if token else None
+    registration = payload.get("sub") if payload else None
+    if registration is None:
+        return None
+
+    cached = auth_cache.get(token)
+    if cached is not None:
+        snapshot, expiration = cached
+        if expiration >= datetime.utcnow() and snapshot["registration"] == registration:
+            if snapshot["accessStatus"] != models.AccessStatus.active:
+                return None
+            user = models.User(**snapshot)
+            make_transient_to_detached(user)
+            return user
+        auth_cache.pop(token)
+
+    async with AsyncSessionLocal() as db:
+        user = (await db.execute(
+            select(models.User).where(models.User.registration == registration)
+        )).scalars().first()
+        if user is None or user.accessStatus != models.AccessStatus.active:
+            return None
+        session = (await db.execute(
+            select(models.Session).where(models.Session.token == token)
+        )).scalars().first()
+        if session is None or session.expirationDate < datetime.utcnow():
+            return None
+
+    _cache_user_session(token, user, session.expirationDate)
     return user
 
 # --- Dependências de Autorização ---
@@ -0,0 +1,131 @@
+# ---------------- BENCHMARK: LATÊNCIA DA AUTENTICAÇÃO ---------------- #
+"""
+Mede a latência (p50/p95/p99) de requisições autenticadas sob carga
+concorrente, comparando a dependência antiga (consultas síncronas executadas
+dentro de `async def`, bloqueando o event loop) com a atual (consultas no
+threadpool).
+
+O app roda em processo com um banco SQLite temporário. Para simular a latência
+de ida e volta do MySQL, cada consulta dorme `--db-latency-ms` milissegundos.
+O cache de autenticação é desativado para que todas as requisições paguem as
+duas consultas (usuário + sessão).
+
+Mantenha `--concurrency` abaixo do tamanho do pool (pool_size + max_overflow):
+no modo antigo o loop bloqueado não consegue devolver conexões ao pool e o
+benchmark fica parado até o timeout do pool.
+
+Uso:
+    python -m backend.benchmarks.auth_latency --requests 400 --concurrency 20
+"""
+import argparse
+import asyncio
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+_DB_FILE = os.path.join(tempfile.mkdtemp(prefix="uconnect-bench-"), "bench.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{_DB_FILE}"
+os.environ["AUTH_CACHE_TTL_SECONDS"] = "0"
+logging.disable(logging.CRITICAL)
+
+import httpx
+from fastapi import Depends, HTTPException, status
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from backend.app import db as app_db, models, utils
+from backend.app.main import app
+
+
+# --- Dependência Antiga (referência "antes") ---
+# Cópia do comportamento original: consultas síncronas direto no event loop.
+async def legacy_get_current_user(token: str = Depends(utils.oauth2_scheme), db: Session = Depends(app_db.get_db)):
+    payload = utils.decode_token(token)
+    if payload is None:
+        raise utils.credentials_exception
+    user = db.query(models.User).filter(models.User.registration == payload.get("sub")).first()
+    if user is None:
+        raise utils.credentials_exception
+    session = db.query(models.Session).filter(models.Session.token == token).first()
+    if session is None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Sessão inválida ou expirada")
+    return user
+
+
+def seed(n_users: int) -> list[str]:
+    db = app_db.SessionLocal()
+    tokens = []
+    for i in range(n_users):
+        user = models.User(registration=f"bench{i}", name=f"Bench {i}", email=f"bench{i}@example.com",
+                           passwordHash="x", role=models.UserRole.student)
+        db.add(user)
+        db.flush()
+        token, expire = utils.create_access_token(data={"sub": user.registration})
+        db.add(models.Session(token=token, userId=user.id, expirationDate=expire))
+        tokens.append(token)
+    db.commit()
+    db.close()
+    return tokens
+
+
+async def run(tokens: list[str], total: int, concurrency: int) -> list[float]:
+    latencies: list[float] = []
+    semaphore = asyncio.Semaphore(concurrency)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def one(i: int):
+            async with semaphore:
+                headers = {"Authorization": f"Bearer {tokens[i % len(tokens)]}"}
+                start = time.perf_counter()
+                response = await client.get("/users/me", headers=headers)
+                latencies.append((time.perf_counter() - start) * 1000)
+                assert response.status_code == 200, response.text
+        await asyncio.gather(*(one(i) for i in range(total)))
+    return latencies
+
+
+def percentile(values: list[float], pct: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def report(label: str, latencies: list[float], elapsed: float) -> None:
+    print(
+        f"{label:<8} n={len(latencies):<5} "
+        f"p50={percentile(latencies, 50):8.1f}ms p95={percentile(latencies, 95):8.1f}ms "
+        f"p99={percentile(latencies, 99):8.1f}ms mean={statistics.mean(latencies):8.1f}ms "
+        f"rps={len(latencies) / elapsed:8.1f}"
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--db-latency-ms", type=float, default=2.0)
+    args = parser.parse_args(argv)
+
+    app_db.engine.echo = False
+    app_db.Base.metadata.create_all(bind=app_db.engine)
+    tokens = seed(args.users)
+
+    delay = args.db_latency_ms / 1000
+    event.listen(app_db.engine, "before_cursor_execute", lambda *a, **k: time.sleep(delay))
+
+    for label, override in (("antes", legacy_get_current_user), ("depois", None)):
+        if override is not None:
+            app.dependency_overrides[utils.get_current_user] = override
+        else:
+            app.dependency_overrides.clear()
+        start = time.perf_counter()
+        latencies = asyncio.run(run(tokens, args.requests, args.concurrency))
+        report(label, latencies, time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,106 @@
+# ---------------- BENCHMARK: CUSTO DO FAN-OUT POR DESTINATÁRIO ---------------- #
+"""
+Micro-benchmark do custo de serialização no broadcast de um evento
+`message:new` para N conexões, medido em microssegundos por destinatário.
+
+Compara:
+- `send_json` por socket (um `json.dumps` por destinatário, como antes);
+- `Frame` compartilhado em JSON (uma serialização por evento);
+- `Frame` compartilhado em MessagePack (se `msgpack` estiver instalado).
+
+Os sockets são simulados e apenas guardam o último frame, para isolar o
+custo de CPU do event loop (serialização + enfileiramento).
+
+Uso:
+    python -m backend.benchmarks.fanout_encode --recipients 500 --events 200
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+
+from backend.app.connections import ClientConnection
+from backend.app.framing import ENCODING_JSON, ENCODING_MSGPACK, Frame, msgpack
+
+
+class FakeWebSocket:
+    """WebSocket simulado: guarda o último frame enviado."""
+    def __init__(self):
+        self.last = None
+
+    async def send_json(self, data):
+        self.last = json.dumps(data)
+
+    async def send_text(self, data):
+        self.last = data
+
+    async def send_bytes(self, data):
+        self.last = data
+
+    async def close(self, code=1000, reason=None):
+        pass
+
+
+def make_event(i: int) -> dict:
+    return {
+        "type": "message:new",
+        "chat_id": 42,
+        "message": {
+            "id": i,
+            "content": "Professor, a entrega do trabalho ainda é na sexta-feira? " * 2,
+            "timestamp": "2026-10-17T10:00:00.000000",
+            "authorId": 1234,
+            "authorName": "Maria da Silva",
+        },
+    }
+
+
+async def per_socket_send_json(recipients: int, events: int) -> float:
+    sockets = [FakeWebSocket() for _ in range(recipients)]
+    start = time.perf_counter()
+    for i in range(events):
+        payload = make_event(i)
+        await asyncio.gather(*[ws.send_json(payload) for ws in sockets])
+    return time.perf_counter() - start
+
+
+async def shared_frame(recipients: int, events: int, encoding: str) -> float:
+    connections = [ClientConnection(FakeWebSocket(), encoding, max_queue=events + 1) for _ in range(recipients)]
+    for conn in connections:
+        conn.start()
+    start = time.perf_counter()
+    for i in range(events):
+        frame = Frame(make_event(i))
+        for conn in connections:
+            conn.offer(frame)
+        # deixa as tasks escritoras esvaziarem as filas
+        while any(not conn.queue.empty() for conn in connections):
+            await asyncio.sleep(0)
+    elapsed = time.perf_counter() - start
+    for conn in connections:
+        await conn.close()
+    return elapsed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--recipients", type=int, default=500)
+    parser.add_argument("--events", type=int, default=200)
+    args = parser.parse_args(argv)
+
+    deliveries = args.recipients * args.events
+    sample = make_event(0)
+    scenarios = [("send_json por socket", lambda: per_socket_send_json(args.recipients, args.events), len(json.dumps(sample))),
+                 ("Frame JSON", lambda: shared_frame(args.recipients, args.events, ENCODING_JSON), len(Frame(sample).text))]
+    if msgpack is not None:
+        scenarios.append(("Frame MessagePack", lambda: shared_frame(args.recipients, args.events, ENCODING_MSGPACK), len(Frame(sample).binary)))
+
+    print(f"{args.recipients} destinatários x {args.events} eventos")
+    for label, scenario, size in scenarios:
+        elapsed = asyncio.run(scenario())
+        print(f"{label:<22} {elapsed * 1e6 / deliveries:7.2f} µs/destinatário  frame={size} bytes")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,156 @@
+# ---------------- BENCHMARK: GRAVAÇÃO DE MENSAGENS (GROUP COMMIT) ---------------- #
+"""
+Compara a vazão de gravação de mensagens dos chats no caminho atual (um
+INSERT + commit por mensagem) com o gravador em lote (`MessageWriter`, ver
+message_writer.py), que junta as mensagens de alguns milissegundos em uma
+única transação.
+
+Simula uma rajada: `--concurrency` remetentes enviam, ao todo, `--messages`
+mensagens para `--chats` conversas, cada envio chamando `_create_message`
+(o mesmo código de `POST /chats/{id}/messages` e do `message:send`). Mede a
+vazão (mensagens/s), a latência de cada envio até o retorno do payload e o
+número de commits.
+
+O banco é um SQLite temporário em disco: cada commit faz fsync, como no
+MySQL, mas os números absolutos não são comparáveis aos de produção;
+compare os modos entre si.
+
+Uso:
+    python -m backend.benchmarks.message_write --messages 2000 --concurrency 100
+"""
+import argparse
+import asyncio
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+_DB_FILE = os.path.join(tempfile.mkdtemp(prefix="uconnect-bench-"), "bench.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{_DB_FILE}"
+logging.disable(logging.CRITICAL)
+
+from sqlalchemy import event, func, select
+
+from backend.app import db as app_db, models
+from backend.app.backplane import backplane
+from backend.app.dispatch import dispatcher
+from backend.app.main import app  # noqa: F401 (cria as tabelas)
+from backend.app.message_writer import MessageWriter
+from backend.app.routers import chat
+
+
+def seed(n_users: int, n_chats: int) -> tuple[list[models.User], list[tuple[int, int]]]:
+    db = app_db.SessionLocal()
+    users = [
+        models.User(registration=f"writer{i}", name=f"Writer {i}", email=f"writer{i}@example.com",
+                    passwordHash="x", role=models.UserRole.student)
+        for i in range(n_users)
+    ]
+    db.add_all(users)
+    routes = []
+    for i in range(n_chats):
+        channel = models.Channel(name=f"Channel-{i}", conversation=models.Conversation(title=f"Chat {i}"))
+        subchannel = models.Subchannel(name="Geral", parent_channel=channel)
+        db.add(subchannel)
+        db.flush()
+        routes.append((channel.conversationId, subchannel.id))
+    db.commit()
+    for user in users:
+        db.refresh(user)
+    db.expunge_all()
+    db.close()
+    return users, routes
+
+
+async def run_mode(writer: MessageWriter | None, users, routes, messages: int, concurrency: int) -> dict:
+    commits = 0
+
+    def count_commit(conn):
+        nonlocal commits
+        commits += 1
+
+    event.listen(app_db.async_engine.sync_engine, "commit", count_commit)
+    chat.message_writer = writer or MessageWriter(enabled=False)
+    await chat.message_writer.start()
+
+    latencies: list[float] = []
+    errors = 0
+    counter = iter(range(messages))
+
+    async def sender(worker: int) -> None:
+        nonlocal errors
+        for i in counter:
+            chat_id, subchannel_id = routes[i % len(routes)]
+            author = users[(worker + i) % len(users)]
+            start = time.perf_counter()
+            try:
+                async with app_db.AsyncSessionLocal() as db:
+                    await chat._create_message(db, chat_id, subchannel_id, author, f"Pergunta {i} sobre a aula")
+                latencies.append(time.perf_counter() - start)
+            except Exception:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(sender(worker) for worker in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    await chat.message_writer.stop()
+    event.remove(app_db.async_engine.sync_engine, "commit", count_commit)
+
+    latencies.sort()
+    return {
+        "elapsed": elapsed,
+        "ok": len(latencies),
+        "errors": errors,
+        "commits": commits,
+        "throughput": len(latencies) / elapsed,
+        "p50_ms": statistics.median(latencies) * 1000 if latencies else 0.0,
+        "p99_ms": latencies[int(len(latencies) * 0.99)] * 1000 if latencies else 0.0,
+    }
+
+
+async def run(args, users, routes) -> list[tuple[str, dict]]:
+    await backplane.start()
+    await dispatcher.start()
+    results = [("direto (1 commit por mensagem)", await run_mode(None, users, routes, args.messages, args.concurrency))]
+    writer = MessageWriter(enabled=True, max_delay=args.delay_ms / 1000, batch_size=args.batch_size)
+    results.append((f"group commit ({args.delay_ms:g}ms, até {args.batch_size})",
+                    await run_mode(writer, users, routes, args.messages, args.concurrency)))
+    await dispatcher.stop()
+    await backplane.stop()
+    await app_db.async_engine.dispose()
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--chats", type=int, default=20)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--delay-ms", type=float, default=5)
+    parser.add_argument("--batch-size", type=int, default=200)
+    args = parser.parse_args(argv)
+
+    app_db.engine.echo = False
+    app_db.async_engine.echo = False
+    users, routes = seed(args.users, args.chats)
+    results = asyncio.run(run(args, users, routes))
+
+    db = app_db.SessionLocal()
+    stored = db.scalar(select(func.count(models.Message.id)))
+    counted = db.scalar(select(func.sum(models.ConversationSummary.messageCount)))
+    db.close()
+
+    print(f"{args.messages} mensagens por modo, {args.concurrency} remetentes, {args.chats} conversas")
+    print(f"{'modo':<34} {'msg/s':>8} {'p50':>9} {'p99':>9} {'commits':>8} {'erros':>6}")
+    for name, result in results:
+        print(f"{name:<34} {result['throughput']:8.0f} {result['p50_ms']:7.1f}ms {result['p99_ms']:7.1f}ms "
+              f"{result['commits']:8d} {result['errors']:6d}")
+    print(f"mensagens gravadas: {stored}, soma dos resumos: {counted}")
+    return 0 if stored == counted == sum(result["ok"] for _, result in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
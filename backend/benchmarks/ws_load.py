@@ -0,0 +1,305 @@
+# ---------------- BENCHMARK: CARGA DE WEBSOCKETS (FAN-OUT DOS CHATS) ---------------- #
+"""
+Teste de carga do fan-out dos chats: abre milhares de WebSockets simulados
+distribuídos em vários chats, envia mensagens por `POST /chats/{id}/messages`
+a uma taxa configurável e mede a latência de ponta a ponta (do início do POST
+até a chegada do `message:new` em cada participante conectado).
+
+O app roda em um worker uvicorn local, iniciado por este script em um
+processo filho com um banco SQLite temporário (sem MySQL nem Redis). O
+processo separado permite medir a CPU e a memória do servidor sem misturar
+o custo dos clientes simulados, que rodam todos no event loop deste processo.
+
+Relatório:
+- latência de entrega (p50/p95/p99/máx) e entregas recebidas x esperadas;
+- latência do POST (resposta HTTP);
+- CPU do servidor por mensagem e por entrega (utime + stime do processo);
+- memória do servidor por conexão (aumento do RSS ao abrir os sockets).
+
+Com poucos núcleos, clientes e servidor disputam a CPU e a latência medida
+inclui esse custo; compare execuções na mesma máquina.
+
+Uso:
+    python -m backend.benchmarks.ws_load --clients 2000 --chats 200 --rate 50 --duration 10
+    python -m backend.benchmarks.ws_load --endpoint chat   # sockets antigos /chats/ws/{id}
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+# O processo filho (servidor) herda o mesmo arquivo de banco.
+_DB_FILE = os.environ.get("WS_LOAD_DB") or os.path.join(tempfile.mkdtemp(prefix="uconnect-bench-"), "bench.db")
+os.environ["WS_LOAD_DB"] = _DB_FILE
+os.environ["DATABASE_URL"] = f"sqlite:///{_DB_FILE}"
+logging.disable(logging.CRITICAL)
+
+import httpx
+from websockets.asyncio.client import connect
+
+from backend.app import db as app_db, models, utils
+from backend.app.main import app
+
+_CLK_TCK = os.sysconf("SC_CLK_TCK")
+
+
+# --- Servidor ---
+def serve(port: int) -> None:
+    import uvicorn
+
+    app_db.engine.echo = False
+    app_db.async_engine.echo = False
+    uvicorn.run(app, host="127.0.0.1", port=port, log_level="warning", backlog=4096)
+
+
+def start_server(port: int) -> subprocess.Popen:
+    process = subprocess.Popen([sys.executable, "-m", "backend.benchmarks.ws_load", "--serve", str(port)])
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("o servidor encerrou durante a inicialização")
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/health", timeout=1).status_code == 200:
+                return process
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("o servidor não respondeu em 30s")
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def cpu_seconds(pid: int) -> float:
+    with open(f"/proc/{pid}/stat") as f:
+        fields = f.read().rsplit(")", 1)[1].split()
+    # utime e stime são os campos 14 e 15 (contando a partir de pid = 1).
+    return (int(fields[11]) + int(fields[12])) / _CLK_TCK
+
+
+def rss_bytes(pid: int) -> int:
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) * 1024
+    return 0
+
+
+# --- Dados ---
+# Cada cliente é um usuário distinto, participante de um único chat. Canal,
+# subcanal e resumo já existem: o benchmark mede o envio em regime, não a
+# criação da primeira mensagem de cada conversa.
+def seed(n_clients: int, n_chats: int) -> dict[int, list[str]]:
+    db = app_db.SessionLocal()
+    users = [
+        models.User(registration=f"load{i}", name=f"Load {i}", email=f"load{i}@example.com",
+                    passwordHash="x", role=models.UserRole.student)
+        for i in range(n_clients)
+    ]
+    chats = [models.Conversation(title=f"Load {i}", type=models.ConversationType.group) for i in range(n_chats)]
+    db.add_all(users + chats)
+    db.flush()
+
+    tokens: dict[int, list[str]] = {chat.id: [] for chat in chats}
+    participants = []
+    for i, user in enumerate(users):
+        chat = chats[i % n_chats]
+        token, expire = utils.create_access_token(data={"sub": user.registration})
+        db.add(models.Session(token=token, userId=user.id, expirationDate=expire))
+        participants.append({"conversationId": chat.id, "userId": user.id})
+        tokens[chat.id].append(token)
+    db.execute(models.conversation_participants.insert(), participants)
+
+    for chat in chats:
+        channel = models.Channel(name=f"Channel-{chat.id}", conversationId=chat.id)
+        channel.subchannels.append(models.Subchannel(name="Geral"))
+        db.add(channel)
+        db.add(models.ConversationSummary(conversationId=chat.id, messageCount=0))
+    db.commit()
+    db.close()
+    return tokens
+
+
+def percentile(values: list[float], p: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+
+
+def format_ms(values: list[float]) -> str:
+    return "  ".join(
+        f"{name} {percentile(values, p) * 1000:7.1f}ms" for name, p in (("p50", 50), ("p95", 95), ("p99", 99), ("máx", 100))
+    )
+
+
+# --- Clientes Simulados ---
+class LoadStats:
+    def __init__(self):
+        self.connected = 0
+        self.failed = 0
+        self.latencies: list[float] = []
+        self.closed_by_server = 0
+
+
+async def run_client(url: str, chat_id: int, multiplexed: bool, stats: LoadStats, gate: asyncio.Semaphore) -> None:
+    try:
+        async with gate:
+            ws = await connect(url, open_timeout=30, max_queue=None)
+            if multiplexed:
+                await ws.send(json.dumps({"type": "subscribe", "chat_id": chat_id}))
+    except Exception:
+        stats.failed += 1
+        return
+    try:
+        if not multiplexed:
+            stats.connected += 1
+        async for raw in ws:
+            event = json.loads(raw)
+            kind = event.get("type")
+            if kind == "message:new":
+                stats.latencies.append(time.time() - float(event["message"]["content"]))
+            elif kind == "ping":
+                await ws.send('{"type": "pong"}')
+            elif kind == "subscribed":
+                stats.connected += 1
+        stats.closed_by_server += 1
+    except asyncio.CancelledError:
+        raise
+    except Exception:
+        stats.closed_by_server += 1
+    finally:
+        await ws.close()
+
+
+async def run_load(args, tokens: dict[int, list[str]], port: int, server_pid: int) -> None:
+    stats = LoadStats()
+    gate = asyncio.Semaphore(args.connect_concurrency)
+    multiplexed = args.endpoint == "ws"
+    base = f"ws://127.0.0.1:{port}"
+
+    rss_before = rss_bytes(server_pid)
+    start = time.perf_counter()
+    clients = []
+    for chat_id, chat_tokens in tokens.items():
+        for token in chat_tokens:
+            url = f"{base}/ws?token={token}" if multiplexed else f"{base}/chats/ws/{chat_id}?token={token}"
+            clients.append(asyncio.create_task(run_client(url, chat_id, multiplexed, stats, gate)))
+    while stats.connected + stats.failed < args.clients and time.perf_counter() - start < args.connect_timeout:
+        await asyncio.sleep(0.1)
+    connect_elapsed = time.perf_counter() - start
+    await asyncio.sleep(1)
+    rss_after = rss_bytes(server_pid)
+
+    rng = random.Random(args.seed)
+    chat_ids = list(tokens)
+    total = int(args.rate * args.duration)
+    http_latencies: list[float] = []
+    http_errors = 0
+
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=30,
+                                 limits=httpx.Limits(max_connections=args.http_concurrency)) as http:
+        expected = 0
+
+        async def send(chat_id: int, token: str) -> None:
+            nonlocal expected, http_errors
+            sent_at = time.time()
+            try:
+                response = await http.post(f"/chats/{chat_id}/messages", json={"content": f"{sent_at:.6f}"},
+                                           headers={"Authorization": f"Bearer {token}"})
+                if response.status_code == 201:
+                    http_latencies.append(time.time() - sent_at)
+                    expected += len(tokens[chat_id])
+                    return
+            except httpx.HTTPError:
+                pass
+            http_errors += 1
+
+        cpu_before = cpu_seconds(server_pid)
+        start = time.perf_counter()
+        sends = []
+        for i in range(total):
+            delay = start + i / args.rate - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            chat_id = rng.choice(chat_ids)
+            sends.append(asyncio.create_task(send(chat_id, rng.choice(tokens[chat_id]))))
+        await asyncio.gather(*sends)
+        send_elapsed = time.perf_counter() - start
+        # Aguarda as entregas pendentes (até --drain segundos).
+        deadline = time.perf_counter() + args.drain
+        while len(stats.latencies) < expected and time.perf_counter() < deadline:
+            await asyncio.sleep(0.1)
+        cpu_used = cpu_seconds(server_pid) - cpu_before
+        metrics = (await http.get("/metrics")).json()
+
+    for client in clients:
+        client.cancel()
+    await asyncio.gather(*clients, return_exceptions=True)
+
+    delivered = len(stats.latencies)
+    sent_ok = total - http_errors
+    per_conn = (rss_after - rss_before) / stats.connected if stats.connected else 0
+    print(f"endpoint               {'/ws (multiplexado)' if multiplexed else '/chats/ws/{chat_id}'}")
+    print(f"clientes conectados    {stats.connected}/{args.clients} em {len(chat_ids)} chats "
+          f"(falhas: {stats.failed}, {connect_elapsed:.1f}s)")
+    print(f"memória do servidor    RSS {rss_before / 2**20:.1f} MB -> {rss_after / 2**20:.1f} MB "
+          f"({per_conn / 1024:.1f} KB por conexão)")
+    print(f"mensagens enviadas     {sent_ok}/{total} ok em {send_elapsed:.1f}s "
+          f"({sent_ok / send_elapsed:.1f} msg/s, alvo {args.rate:g})")
+    print(f"latência do POST       {format_ms(http_latencies)}")
+    print(f"entregas               {delivered}/{expected} esperadas "
+          f"(sockets encerrados pelo servidor: {stats.closed_by_server})")
+    print(f"latência de entrega    {format_ms(stats.latencies)}")
+    print(f"CPU do servidor        {cpu_used:.2f}s ({cpu_used / max(sent_ok, 1) * 1000:.2f} ms por mensagem, "
+          f"{cpu_used / max(delivered, 1) * 1e6:.0f} µs por entrega)")
+    print(f"dispatcher             {json.dumps(metrics.get('dispatcher'))}")
+    print(f"websockets             {json.dumps(metrics.get('websockets'))}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=2000)
+    parser.add_argument("--chats", type=int, default=200)
+    parser.add_argument("--rate", type=float, default=50, help="mensagens por segundo (todas as conversas)")
+    parser.add_argument("--duration", type=float, default=10, help="segundos de envio")
+    parser.add_argument("--drain", type=float, default=10, help="espera máxima pelas entregas após o envio")
+    parser.add_argument("--endpoint", choices=("ws", "chat"), default="ws")
+    parser.add_argument("--connect-concurrency", type=int, default=100)
+    parser.add_argument("--connect-timeout", type=float, default=120)
+    parser.add_argument("--http-concurrency", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--serve", type=int, metavar="PORTA", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.serve:
+        serve(args.serve)
+        return 0
+    if args.chats > args.clients:
+        parser.error("--chats deve ser menor ou igual a --clients")
+
+    app_db.engine.echo = False
+    tokens = seed(args.clients, args.chats)
+    port = free_port()
+    server = start_server(port)
+    try:
+        asyncio.run(run_load(args, tokens, port, server.pid))
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
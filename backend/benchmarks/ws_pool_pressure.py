@@ -0,0 +1,126 @@
+# ---------------- VERIFICAÇÃO: WEBSOCKETS x POOL DE CONEXÕES ---------------- #
+"""
+Abre mais WebSockets de notificações (`/notifications/ws`) do que o pool do
+banco comporta (pool_size + max_overflow) e, com todos eles abertos, executa
+requisições HTTP que precisam de uma conexão do pool (`GET /auth/validate`).
+
+Com o endpoint antigo (`Depends(get_db)` mantido durante todo o socket), cada
+socket prendia uma conexão do pool: a partir do limite, novos sockets e as
+requisições HTTP falham por timeout do pool. O endpoint atual autentica com o
+cache/uma sessão de curta duração e não deve manter nenhuma conexão presa.
+
+O app roda em processo com um banco SQLite temporário. `--legacy` executa a
+mesma verificação contra uma cópia do endpoint antigo, para comparação. O
+timeout do pool é reduzido (`--pool-timeout`) para que o esgotamento apareça
+como erro em segundos, em vez dos 30s padrão.
+
+Sai com código 1 se alguma conexão ficar presa ou alguma requisição falhar.
+
+Uso:
+    python -m backend.benchmarks.ws_pool_pressure
+    python -m backend.benchmarks.ws_pool_pressure --legacy
+"""
+import argparse
+import contextlib
+import logging
+import os
+import sys
+import tempfile
+import time
+
+_DB_FILE = os.path.join(tempfile.mkdtemp(prefix="uconnect-bench-"), "bench.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{_DB_FILE}"
+logging.disable(logging.CRITICAL)
+
+from fastapi import Depends, WebSocket, WebSocketDisconnect
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import Session
+
+from backend.app import db as app_db, models, utils
+from backend.app.main import app
+from backend.app.routers.notifications import manager
+
+
+# --- Endpoint Antigo (referência "antes") ---
+# Cópia do comportamento original: a sessão da dependência fica aberta
+# enquanto o socket estiver conectado.
+@app.websocket("/legacy/notifications/ws")
+async def legacy_websocket_endpoint(websocket: WebSocket, token: str, db: Session = Depends(app_db.get_db)):
+    payload = utils.decode_token(token)
+    user = db.query(models.User).filter(models.User.registration == payload.get("sub")).first()
+    conn = await manager.connect(websocket, user.id)
+    try:
+        while True:
+            await websocket.receive_text()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        await manager.disconnect(conn, user.id)
+
+
+def seed(n_users: int) -> list[str]:
+    db = app_db.SessionLocal()
+    tokens = []
+    for i in range(n_users):
+        user = models.User(registration=f"bench{i}", name=f"Bench {i}", email=f"bench{i}@example.com",
+                           passwordHash="x", role=models.UserRole.student)
+        db.add(user)
+        db.flush()
+        token, expire = utils.create_access_token(data={"sub": user.registration})
+        db.add(models.Session(token=token, userId=user.id, expirationDate=expire))
+        tokens.append(token)
+    db.commit()
+    db.close()
+    return tokens
+
+
+def main(argv=None):
+    pool = app_db.engine.pool
+    pool_limit = pool.size() + pool._max_overflow
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sockets", type=int, default=pool_limit + 5)
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--pool-timeout", type=float, default=2.0)
+    parser.add_argument("--legacy", action="store_true", help="usa a cópia do endpoint antigo")
+    args = parser.parse_args(argv)
+
+    app_db.engine.echo = False
+    app_db.async_engine.echo = False
+    pool._timeout = args.pool_timeout
+    tokens = seed(args.sockets)
+    path = "/legacy/notifications/ws" if args.legacy else "/notifications/ws"
+
+    with TestClient(app) as client, contextlib.ExitStack() as sockets:
+        opened = failed_sockets = 0
+        start = time.perf_counter()
+        for token in tokens:
+            try:
+                sockets.enter_context(client.websocket_connect(f"{path}?token={token}"))
+                opened += 1
+            except Exception:
+                failed_sockets += 1
+        connect_elapsed = time.perf_counter() - start
+        checked_out = pool.checkedout()
+
+        ok = failed_requests = 0
+        start = time.perf_counter()
+        for i in range(args.requests):
+            try:
+                response = client.get("/auth/validate", headers={"Authorization": f"Bearer {tokens[i % len(tokens)]}"})
+                ok += response.status_code == 200
+                failed_requests += response.status_code != 200
+            except Exception:
+                failed_requests += 1
+        http_elapsed = time.perf_counter() - start
+
+    print(f"endpoint           {path}")
+    print(f"limite do pool     {pool_limit} (pool_size + max_overflow)")
+    print(f"sockets abertos    {opened}/{args.sockets} (falhas: {failed_sockets}, {connect_elapsed:.2f}s)")
+    print(f"conexões presas    {checked_out}")
+    print(f"requisições HTTP   {ok}/{args.requests} ok (falhas: {failed_requests}, {http_elapsed:.2f}s)")
+    return 0 if failed_sockets == failed_requests == checked_out == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
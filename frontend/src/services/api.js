@@ -194,9 +194,15 @@ export const getConversations = async () => {
   return handleResponse(response);
 };
 
-// Mensagens da conversa — aceita options (ex.: { signal })
-export const getMessages = async (chatId, options = {}) => {
-  const response = await fetch(`${API_URL}/chats/${chatId}/messages`, {
+// Página de mensagens (cursor) — retorna { items, next_cursor, prev_cursor }.
+// Use next_cursor como beforeId para carregar mensagens mais antigas.
+export const getMessagesPage = async (chatId, { beforeId, afterId, limit } = {}, options = {}) => {
+  const qs = new URLSearchParams();
+  if (beforeId != null) qs.set("before_id", beforeId);
+  if (afterId != null) qs.set("after_id", afterId);
+  if (limit != null) qs.set("limit", limit);
+  const url = `${API_URL}/chats/${chatId}/messages${qs.toString() ? `?${qs}` : ""}`;
+  const response = await fetch(url, {
     method: "GET",
     headers: getHeaders(),
     ...options,
@@ -204,6 +210,20 @@ export const getMessages = async (chatId, options = {}) => {
   return handleResponse(response);
 };
 
+// Mensagens mais recentes da conversa — aceita options (ex.: { signal })
+export const getMessages = async (chatId, options = {}) => {
+  const page = await getMessagesPage(chatId, {}, options);
+  return page.items;
+};
+
+// Contagem de não lidas de todas as conversas — { total, chats: [{ chat_id, unread_count }] }
+export const getUnreadCounts = async () => {
+  const response = await fetch(`${API_URL}/chats/unread`, {
+    headers: getHeaders(),
+  });
+  return handleResponse(response);
+};
+
 // Enviar mensagem
 export const sendMessage = async (chatId, messageContent) => {
   const response = await fetch(`${API_URL}/chats/${chatId}/messages`, {